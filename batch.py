@@ -0,0 +1,108 @@
+from sys import argv, exit
+from os import path, walk, cpu_count
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+from main import Figure, FORMATS
+from exceptions import GFDException
+from cache import ResultCache
+
+class Result:
+    """
+    result of rendering a single gfd file in the batch
+
+    filename: str
+        the gfd file
+    seconds: float
+        wall time spent on the file
+    error: str
+        None if the file is rendered, otherwise the error message
+    input_file, line_count: str, int
+        where the error is, if it is a GFDException in a gfd line
+    cached: bool
+        whether the outputs are copied from the result cache
+    """
+    def __init__(self, filename, seconds, error=None, input_file=None, line_count=None, cached=False):
+        self.filename = filename
+        self.seconds = seconds
+        self.error = error
+        self.input_file = input_file
+        self.line_count = line_count
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return f"{'cached' if self.cached else 'ok':6} {self.seconds:8.3f}s  {self.filename}"
+        location = f"{self.input_file}:{self.line_count}: " if self.line_count else ""
+        return f"error  {self.seconds:8.3f}s  {self.filename}\n       {location}{self.error}"
+
+def gfd_files(paths) -> list[str]:
+    """gfd files in the given paths, directories are searched recursively"""
+    files = []
+    for p in paths:
+        if path.isdir(p):
+            for root, _, names in walk(p):
+                files.extend(path.join(root, name) for name in names if name.endswith(".gfd"))
+        else:
+            files.append(p)
+    return sorted(files)
+
+def render(filename, caching=False, seed=None, formats=(), robust=False) -> Result:
+    """renders a single gfd file into its asy and txt files and the files of the formats, each call uses a new figure"""
+    start = perf_counter()
+    try:
+        cached = Figure(seed, formats=formats, robust=robust).interpret(filename, ResultCache() if caching else None)
+    except GFDException as e:
+        return Result(filename, perf_counter() - start, e.message, e.input_file, e.line_count)
+    except Exception as e:
+        return Result(filename, perf_counter() - start, f"{type(e).__name__}: {e}")
+    return Result(filename, perf_counter() - start, cached=cached)
+
+def render_all(filenames, workers=None, caching=False, seed=None, formats=(), robust=False) -> list[Result]:
+    """renders the gfd files in a process pool, one figure per task"""
+    n = len(filenames)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render, filenames, [caching] * n, [seed] * n, [formats] * n, [robust] * n))
+
+def usage():
+    print("usage: python batch.py [--cache] [--robust] [--jsonl] [--npz] [--seed seed] [-j workers] <gfd files or directories>")
+    exit(2)
+
+if __name__ == "__main__":
+    args = argv[1:]
+    caching = robust = False
+    workers = seed = None
+    formats = []
+    paths = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--cache":
+            caching = True
+        elif arg == "--robust":
+            robust = True
+        elif arg.startswith("--") and arg[2:] in FORMATS:
+            formats.append(arg[2:])
+        elif arg == "-j" and args and args[0].isdigit():
+            workers = int(args.pop(0))
+        elif arg == "--seed" and args and args[0].lstrip("-").isdigit():
+            seed = int(args.pop(0))
+        elif arg.startswith("-"):
+            usage()
+        else:
+            paths.append(arg)
+    if not paths:
+        usage()
+    formats = tuple(formats)
+
+    filenames = gfd_files(paths)
+    start = perf_counter()
+    results = render_all(filenames, workers, caching, seed, formats, robust)
+    for result in results:
+        print(result)
+    failed = sum(not result.ok for result in results)
+    print(f"{len(results) - failed} rendered, {failed} failed in {perf_counter() - start:.3f}s with {workers or cpu_count()} workers")
+    exit(1 if failed else 0)
@@ -0,0 +1,151 @@
+from sys import argv, exit
+from os import path
+from glob import glob
+from json import dump, load
+from time import perf_counter
+from itertools import combinations
+from tempfile import TemporaryDirectory
+import tracemalloc
+import gc
+
+from main import Figure
+from compiler import Compiler
+
+# phases of rendering a figure, in order
+PHASES = ("parse", "construction", "closure", "check_everything", "emission")
+# number of random points of the synthetic figures
+SIZES = (4, 6, 8, 10)
+
+def synthetic_source(n) -> str:
+    """
+    gfd source of n random points with every line through two of them and every circle through three of them
+    the points are random points inside a random triangle so that they are in general position, random_point would put all of them
+    on the unit circle, the triangle is enlarged by reflecting its vertices so that almost collinear points are rare
+    """
+    lines = ["U0 U1 U2 = random_triangle_on_unit_circle"]
+    lines += [f"V{i} = U{(i + 1) % 3} U{i} reflection_pp" for i in range(3)]
+    lines += [f"P{i} = V0 V1 V2 random_point_on_segment random_point_on_segment" for i in range(n)]
+    lines += [f"L{i}_{j} = P{i} P{j} line" for i, j in combinations(range(n), 2)]
+    lines += [f"C{i}_{j}_{k} = P{i} P{j} P{k} circumcircle" for i, j, k in combinations(range(n), 3)]
+    return "\n".join(lines) + "\n"
+
+def run_phases(filename, seed) -> tuple[dict, Figure]:
+    """renders the gfd file without writing it, returns the time of every phase in seconds and the figure"""
+    times = {}
+    start = perf_counter()
+    program = Compiler().compile(filename)
+    times["parse"] = perf_counter() - start
+
+    figure = Figure(seed)
+    start = perf_counter()
+    figure.run(program)
+    times["construction"] = perf_counter() - start
+
+    start = perf_counter()
+    known = figure.known_properties()
+    times["closure"] = perf_counter() - start
+
+    start = perf_counter()
+    unknown = figure.unknown_properties()
+    times["check_everything"] = perf_counter() - start
+
+    start = perf_counter()
+    figure.asy()
+    figure.format_txt(known, unknown)
+    times["emission"] = perf_counter() - start
+
+    figure.counts = {
+        "objects": figure.context.count,
+        "figure objects": len(figure.objects),
+        "known": sum(map(len, known.values())),
+        "unknown": sum(map(len, unknown.values())),
+    }
+    return times, figure
+
+def measure(name, filename, repeat=3, seed=0) -> dict:
+    """best time of every phase over `repeat` runs, object and property counts, and peak memory of a separate run"""
+    best = {}
+    for _ in range(repeat):
+        gc.collect()
+        times, figure = run_phases(filename, seed)
+        for phase, seconds in times.items():
+            best[phase] = min(best.get(phase, seconds), seconds)
+    counts = figure.counts
+
+    # tracemalloc slows everything down, so memory is measured in a run that is not timed
+    gc.collect()
+    tracemalloc.start()
+    run_phases(filename, seed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "times": best,
+        "total": sum(best.values()),
+        "counts": counts,
+        "peak memory": peak,
+    }
+
+def run_benchmarks(sizes=SIZES, repeat=3, seed=0) -> list[dict]:
+    """benchmarks the examples and the synthetic figures"""
+    directory = path.dirname(path.abspath(__file__))
+    results = []
+    for filename in sorted(glob(path.join(directory, "examples", "*", "figure.gfd"))):
+        results.append(measure(path.basename(path.dirname(filename)), filename, repeat, seed))
+    with TemporaryDirectory() as temporary:
+        for n in sizes:
+            filename = path.join(temporary, f"synthetic{n}.gfd")
+            with open(filename, "w") as file:
+                file.write(synthetic_source(n))
+            results.append(measure(f"synthetic-{n}", filename, repeat, seed))
+    return results
+
+def report(results, baseline=None) -> str:
+    """table of the results, with the ratio of the total time to the baseline results if they are given"""
+    baseline = {result["name"]: result for result in baseline or []}
+    header = f"{'figure':16}" + "".join(f"{phase:>18}" for phase in PHASES) + f"{'total':>12}{'objects':>9}{'facts':>8}{'peak KiB':>10}"
+    if baseline:
+        header += f"{'vs base':>9}"
+    lines = [header]
+    for result in results:
+        counts = result["counts"]
+        line = f"{result['name']:16}" + "".join(f"{result['times'][phase] * 1000:16.2f}ms" for phase in PHASES)
+        line += f"{result['total'] * 1000:10.2f}ms{counts['objects']:9}{counts['known'] + counts['unknown']:8}{result['peak memory'] / 1024:10.0f}"
+        if result["name"] in baseline:
+            line += f"{result['total'] / baseline[result['name']]['total']:8.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+def usage():
+    print("usage: python benchmark.py [-r repeat] [-o output.json] [-c baseline.json] [sizes of synthetic figures]")
+    exit(2)
+
+if __name__ == "__main__":
+    args = argv[1:]
+    repeat = 3
+    output = baseline = None
+    sizes = []
+    while args:
+        arg = args.pop(0)
+        if arg in ("-r", "-o", "-c") and args:
+            value = args.pop(0)
+            if arg == "-r":
+                if not value.isdigit():
+                    usage()
+                repeat = int(value)
+            elif arg == "-o":
+                output = value
+            else:
+                with open(value, "r") as file:
+                    baseline = load(file)
+        elif arg.isdigit():
+            sizes.append(int(arg))
+        else:
+            usage()
+
+    results = run_benchmarks(sizes or SIZES, repeat)
+    print(report(results, baseline))
+    if output is not None:
+        with open(output, "w") as file:
+            dump(results, file, indent=4)
@@ -0,0 +1,109 @@
+from os import path, listdir, makedirs, remove, rmdir, stat, utime, getpid, replace
+from hashlib import sha256
+from shutil import copyfile
+
+# rendered figures are cached in this directory
+CACHE_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), ".cache", "results")
+# the least recently used figures are removed when the cache is larger than this many bytes
+MAX_SIZE = 256 * 1024 * 1024
+# outputs of a rendered figure, stored in the cache entry with these extensions, other formats are stored if they are rendered too
+EXTENSIONS = (".asy", ".txt")
+
+def imported_files(filename) -> list[str]:
+    """the gfd file and every file it imports, directly or not, found by scanning the import lines"""
+    files = []
+    pending = [filename]
+    while pending:
+        current = pending.pop()
+        if current in files:
+            continue
+        files.append(current)
+        with open(current, "r") as file:
+            for line in file.read().splitlines():
+                tokens = line.split()
+                if len(tokens) >= 2 and tokens[0] == "%":
+                    pending.append(tokens[1] if tokens[1].endswith(".gfd") else tokens[1] + ".gfd")
+    return files
+
+code_hash = None
+
+def code_version() -> str:
+    """hash of the source files and the template, so that figures rendered by another version are not used"""
+    global code_hash
+    if code_hash is None:
+        directory = path.dirname(path.abspath(__file__))
+        digest = sha256()
+        for name in sorted(listdir(directory)) + ["templates/template.asy"]:
+            if name.endswith(".py") or name.endswith(".asy"):
+                with open(path.join(directory, name), "rb") as file:
+                    digest.update(name.encode() + b"\0" + file.read())
+        code_hash = digest.hexdigest()
+    return code_hash
+
+class ResultCache:
+    """
+    on-disk cache of rendered figures, every entry is a directory with the asy and txt outputs
+    an entry is keyed by the contents of the gfd file and the files it imports, the seed, the lazy and predicate modes and the code version
+    the modification time of an entry is updated when it is used, the oldest ones are removed first when the cache is full
+
+    directory: str
+        directory of the entries
+    max_size: int
+        maximum total size of the entries in bytes
+    """
+    def __init__(self, directory=CACHE_DIRECTORY, max_size=MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, filename, seed=None, robust=False, lazy=False) -> str:
+        digest = sha256(f"{code_version()} {seed}{' robust' if robust else ''}{' lazy' if lazy else ''}".encode())
+        for imported_file in imported_files(filename):
+            with open(imported_file, "rb") as file:
+                digest.update(b"\0" + imported_file.encode() + b"\0" + file.read())
+        return digest.hexdigest()
+
+    def get(self, key, filename, extensions=EXTENSIONS) -> bool:
+        """copies the cached outputs with the extensions next to the gfd file, returns whether they are all in the cache"""
+        entry = path.join(self.directory, key)
+        if not all(path.exists(path.join(entry, f"figure{extension}")) for extension in extensions):
+            return False
+        for extension in extensions:
+            copyfile(path.join(entry, f"figure{extension}"), f"{filename[:-4]}{extension}")
+        utime(entry)
+        return True
+
+    def put(self, key, filename, extensions=EXTENSIONS):
+        """stores the outputs with the extensions of the rendered gfd file"""
+        entry = path.join(self.directory, key)
+        makedirs(entry, exist_ok=True)
+        for extension in extensions:
+            # copied to a temporary file first, so that another process never reads a partially written output
+            temporary = path.join(entry, f"figure{extension}.{getpid()}.tmp")
+            copyfile(f"{filename[:-4]}{extension}", temporary)
+            replace(temporary, path.join(entry, f"figure{extension}"))
+        self.evict()
+
+    def evict(self):
+        """removes the least recently used entries until the cache fits in max_size"""
+        entries = []
+        total = 0
+        for key in listdir(self.directory):
+            entry = path.join(self.directory, key)
+            try:
+                size = sum(stat(path.join(entry, name)).st_size for name in listdir(entry))
+                entries.append((stat(entry).st_mtime_ns, size, entry))
+            except OSError:
+                # removed by another process
+                continue
+            total += size
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            try:
+                for name in listdir(entry):
+                    remove(path.join(entry, name))
+                rmdir(entry)
+            except OSError:
+                continue
+            total -= size
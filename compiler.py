@@ -0,0 +1,293 @@
+from os import path, getcwd, getpid, makedirs, replace
+from hashlib import sha256
+import pickle
+
+from functions import construction_functions, check_functions
+from exceptions import GFDException, FigureException
+from objects import Obj
+
+# compiled programs are cached in this directory, keyed by the hash of the gfd file
+CACHE_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), ".cache", "programs")
+# increase when the instructions change, so that the cached programs are not used
+VERSION = 2
+
+# instructions, (opcode, argument)
+LOAD = 0       # slot, pushes the object in the slot
+STORE = 1      # slot, pops an object into the slot
+CONSTRUCT = 2  # (function name, starred), calls a construction function with the objects on the stack
+CHECK = 3      # function name, calls a check function with the objects on the stack
+ASSIGN = 4     # list[(slot, name) or None], binds the objects on the stack to the names of a construction line
+PRINT = 5      # None, prints the result of a check line
+SEED = 6       # int, seeds the random construction functions unless the figure has a seed
+
+def file_hash(filename) -> str:
+    with open(filename, "rb") as file:
+        return sha256(file.read()).hexdigest()
+
+def registry_hash() -> str:
+    """hash of the names of the construction and check functions, programs compiled with different functions are not reused"""
+    names = sorted(construction_functions) + sorted(check_functions)
+    return sha256(f"{VERSION} {' '.join(names)}".encode()).hexdigest()
+
+class Program:
+    """
+    a gfd file compiled into a flat list of instructions for a stack machine
+    imports and custom functions are inlined, object names are resolved to slot indexes and function names to the functions
+    so running it again, e.g. with another seed, does not tokenize or look up anything
+
+    instructions: list[(int, object)]
+        opcode and argument of every instruction, functions are referred to by name so that the program can be pickled
+    locations: list[(str, int)]
+        file and line number of every instruction, for the errors
+    slot_count: int
+        number of slots, one for every name and every argument of an inlined custom function
+    sources: dict[str, str]
+        hash of the contents of every file that the program is compiled from
+    """
+    def __init__(self, instructions, locations, slot_count, sources):
+        self.instructions = instructions
+        self.locations = locations
+        self.slot_count = slot_count
+        self.sources = sources
+        self.resolve()
+
+    def resolve(self):
+        """instructions with the functions instead of their names"""
+        self.code = []
+        for opcode, argument in self.instructions:
+            if opcode == CONSTRUCT:
+                argument = (construction_functions[argument[0]], argument[1])
+            elif opcode == CHECK:
+                argument = check_functions[argument]
+            self.code.append((opcode, argument))
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["code"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.resolve()
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def changed_sources(self) -> bool:
+        """whether any of the files is changed since the program is compiled"""
+        try:
+            return any(file_hash(filename) != digest for filename, digest in self.sources.items())
+        except OSError:
+            return True
+
+    def run(self, figure):
+        """runs the program, the objects are added to the figure, must be called while the context of the figure is active"""
+        slots = [None] * self.slot_count
+        stack = []
+        objects = figure.objects
+        for i, (opcode, argument) in enumerate(self.code):
+            if opcode == LOAD:
+                stack.append(slots[argument])
+            elif opcode == CONSTRUCT:
+                function, starred = argument
+                args = pop_arguments(stack, function, "construction", self.locations[i])
+                try:
+                    result = function(*args)
+                except FigureException as e:
+                    raise GFDException(e.message, *self.locations[i])
+                results = result if type(result) == tuple else (result,)
+                for obj in results:
+                    if not issubclass(type(obj), Obj):
+                        raise GFDException(f"non Obj return for construction function {function.name}", *self.locations[i])
+                    if starred:
+                        objects[obj.name] = obj
+                stack.extend(results)
+            elif opcode == STORE:
+                slots[argument] = stack.pop()
+            elif opcode == ASSIGN:
+                if len(argument) != len(stack):
+                    raise GFDException(f"lhs ({len(argument)}) and rhs ({len(stack)}) do not have the same number of elements in construction line", *self.locations[i])
+                for target, obj in zip(argument, stack):
+                    if target is None:
+                        continue
+                    if not issubclass(type(obj), Obj):
+                        raise GFDException(f"not Obj ({type(obj)}) return in expression", *self.locations[i])
+                    slot, name = target
+                    obj.name = name
+                    objects[name] = obj
+                    slots[slot] = obj
+                stack.clear()
+                figure.check_pending()
+            elif opcode == CHECK:
+                args = pop_arguments(stack, argument, "check", self.locations[i])
+                try:
+                    result = argument(*args)
+                except FigureException as e:
+                    raise GFDException(e.message, *self.locations[i])
+                if not issubclass(type(result), bool):
+                    raise GFDException(f"non bool return for check function {argument.name}", *self.locations[i])
+                stack.append(result)
+            elif opcode == PRINT:
+                result = stack.pop()
+                if type(result) != bool:
+                    raise GFDException("non bool result for check line", *self.locations[i])
+                print(result)
+                stack.clear()
+                figure.check_pending()
+            elif opcode == SEED:
+                if figure.seed is None:
+                    figure.context.random.seed(argument)
+
+def pop_arguments(stack, function, kind, location) -> list:
+    args = []
+    for arg_type in function.parameters[::-1]:
+        if not stack:
+            raise GFDException(f"not enough inputs for {kind} function {function.name}", *location)
+        arg = stack.pop()
+        if not issubclass(type(arg), arg_type):
+            raise GFDException(f"Input {arg} is not of type {arg_type.__name__} for {kind} function {function.name}", *location)
+        args.append(arg)
+    return args[::-1]
+
+class Compiler:
+    """
+    compiles a gfd file into a Program, the lines are handled the same way as in Figure.interpret_line
+
+    slots: dict[str, int]
+        slot of every object name defined so far
+    custom_functions: dict[str, (int, list[str])]
+        custom functions defined so far, inlined where they are called
+    line_counters: list[[str, int]]
+        stack of the files being compiled and their line numbers
+    """
+    def __init__(self):
+        self.instructions = []
+        self.locations = []
+        self.slots = {}
+        self.slot_count = 0
+        self.custom_functions = {}
+        self.line_counters = []
+        self.sources = {}
+
+    def emit(self, opcode, argument=None):
+        self.instructions.append((opcode, argument))
+        self.locations.append(tuple(self.line_counters[-1]))
+
+    def new_slot(self) -> int:
+        self.slot_count += 1
+        return self.slot_count - 1
+
+    def compile(self, filename) -> Program:
+        self.compile_file(filename)
+        return Program(self.instructions, self.locations, self.slot_count, self.sources)
+
+    def compile_file(self, filename):
+        if filename in map(lambda x: x[0], self.line_counters):
+            raise GFDException("circular import is not allowed", *self.line_counters[-1])
+        with open(filename, "rb") as file:
+            content = file.read()
+        self.sources[path.abspath(filename)] = sha256(content).hexdigest()
+        self.line_counters.append([filename, 0])
+        for line in content.decode().splitlines():
+            self.line_counters[-1][1] += 1
+            self.compile_line(line)
+        self.line_counters.pop()
+
+    def compile_line(self, line):
+        tokens = line.split()
+        if not tokens or tokens[0] == "#":
+            return
+        elif tokens[0] == "%":
+            if len(tokens) < 2:
+                return
+            imported_file = tokens[1] if tokens[1].endswith(".gfd") else tokens[1] + ".gfd"
+            self.compile_file(imported_file)
+        elif tokens[0] == "?":
+            for token in tokens[1:]:
+                self.compile_token(token, [])
+            self.emit(PRINT)
+        elif tokens[0] == ">":
+            if len(tokens) < 4 or tokens[3] != "=":
+                raise GFDException("function line does not have enough tokens or no = in correct place", *self.line_counters[-1])
+            try:
+                parameter_count = int(tokens[1])
+            except ValueError:
+                raise GFDException("first token in function line should be the parameter count", *self.line_counters[-1])
+            self.custom_functions[tokens[2]] = (parameter_count, tokens[4:])
+        elif tokens[0] == "@":
+            if len(tokens) != 2 or not tokens[1].lstrip("-").isdigit():
+                raise GFDException("seed line should have a single integer seed", *self.line_counters[-1])
+            self.emit(SEED, int(tokens[1]))
+        else:
+            if "=" not in tokens:
+                raise GFDException("no = in construction line", *self.line_counters[-1])
+            equal_sign_index = tokens.index("=")
+            for token in tokens[equal_sign_index + 1:]:
+                self.compile_token(token, [])
+            targets = []
+            for name in tokens[:equal_sign_index]:
+                if name == ".":
+                    targets.append(None)
+                    continue
+                if name in self.slots or name in targets:
+                    raise GFDException(f"{name} is already defined", *self.line_counters[-1])
+                targets.append(name)
+            self.emit(ASSIGN, [None if name is None else (self.new_slot(), name) for name in targets])
+            for target in self.instructions[-1][1]:
+                if target is not None:
+                    self.slots[target[1]] = target[0]
+
+    def compile_token(self, token, arguments):
+        """
+        emits the instructions for a token of an expression
+        arguments are the slots of the parameters of the custom function whose body is being compiled, used for $i
+        """
+        starred = "*" in token
+        if starred:
+            token = token[:token.index("*")]
+
+        if token.startswith("$") and token[1:].isdigit() and 0 < int(token[1:]) <= len(arguments):
+            self.emit(LOAD, arguments[int(token[1:]) - 1])
+        elif token in construction_functions:
+            self.emit(CONSTRUCT, (token, starred))
+        elif token in check_functions:
+            self.emit(CHECK, token)
+        elif token in self.custom_functions:
+            parameter_count, function_body = self.custom_functions[token]
+            parameters = [self.new_slot() for _ in range(parameter_count)]
+            for slot in parameters[::-1]:
+                self.emit(STORE, slot)
+            for subtoken in function_body:
+                self.compile_token(subtoken, parameters)
+        elif token in self.slots:
+            self.emit(LOAD, self.slots[token])
+        else:
+            raise GFDException(f"{token} is not defined", *self.line_counters[-1])
+
+def cache_filename(filename, directory) -> str:
+    """
+    imports are relative to the working directory, so it is a part of the key together with the contents of the file
+    the imported files are checked when the program is loaded
+    """
+    key = sha256(f"{registry_hash()} {getcwd()} {file_hash(filename)}".encode()).hexdigest()
+    return path.join(directory, f"{key}.pickle")
+
+def load(filename, directory=CACHE_DIRECTORY) -> Program:
+    """compiled program of the gfd file, from the cache if it is compiled before and none of its files is changed"""
+    cached = cache_filename(filename, directory)
+    if path.exists(cached):
+        try:
+            with open(cached, "rb") as file:
+                program = pickle.load(file)
+            if not program.changed_sources():
+                return program
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            pass
+    program = Compiler().compile(filename)
+    makedirs(directory, exist_ok=True)
+    # written to a temporary file first, so that another process never reads a partially written program
+    temporary = f"{cached}.{getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        pickle.dump(program, file)
+    replace(temporary, cached)
+    return program
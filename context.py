@@ -0,0 +1,123 @@
+from contextvars import ContextVar
+from random import Random
+
+from spatial import SpatialIndex, LineIndex
+from storage import Columns
+from properties import PropertyStore
+
+class Context:
+    """
+    state of a single figure, objects and properties created while the context is active belong to it
+    the figure activates its context while interpreting, so construction and check functions use it without an extra parameter
+    use it as `with context: ...`
+
+    count: int
+        number of objects created so far, id of the next object
+    points, lines, circles: SpatialIndex
+        objects created so far, if the same object is created again the already existing one is returned
+    columns: (Columns, Columns, Columns)
+        coordinates of the points, lines and circles created so far, indexed by the index of the object
+    properties: PropertyStore
+        properties of the objects, filled by the check functions
+    memo: dict[tuple, Obj or tuple[Obj]]
+        results of the deterministic construction functions, by function name and argument ids
+    random: Random
+        generator used by the random construction functions, seeded with the seed of the figure
+    lazy: bool
+        whether the objects created inside construction functions are lightweight, see light
+    depth: int
+        number of construction function calls in progress
+    light_count: int
+        number of lightweight objects created so far, negated, id of the next one
+    pending: list[(str, tuple, list[Obj], list[Obj])]
+        name, memo key, arguments and results of the construction function calls in the gfd lines that are not checked yet in lazy mode
+    checked: set[tuple]
+        memo keys of the calls that are checked in lazy mode
+    rule: str
+        recorded as the rule of the properties found by the check functions, the construction function whose objects are checked
+    robust: bool
+        whether the check functions are evaluated exactly instead of with floats, see predicates.py
+    discovery: Discovery
+        discovery engine of the objects checked by check_figure, None before it is first called
+        kept with the figure, so checking the figure again only checks the objects that are new since then
+    discovered: PropertyStore
+        properties found by discovery, apart from the properties of the context, which are the known ones
+    log: list[Obj]
+        objects created or returned again while it is a list, used for recording what a gfd line uses, None if not recording
+    found: list[(str, tuple[Obj], str)]
+        properties found by the check functions while it is a list, with their rules, used for recording what a gfd line finds, None if not recording
+    """
+    def __init__(self, seed=None, lazy=False, robust=False):
+        self.count = 0
+        self.points = SpatialIndex()
+        self.lines = LineIndex()
+        self.circles = SpatialIndex()
+        self.columns = (Columns("x", "y"), Columns("a", "b", "c"), Columns("ox", "oy", "r"))
+        self.properties = PropertyStore()
+        self.tokens = []
+        self.log = None
+        self.found = None
+        self.memo = {}
+        self.random = Random(seed)
+        self.lazy = lazy
+        self.depth = 0
+        self.light_count = 0
+        self.pending = []
+        self.checked = set()
+        self.rule = "check"
+        self.robust = robust
+        self.discovery = None
+        self.discovered = PropertyStore()
+
+    def touch(self, obj):
+        """called for every object created or returned again"""
+        if self.log is not None:
+            self.log.append(obj)
+
+    def add_fact(self, name, objs):
+        """adds a property found by a check function to the properties with the current rule, see PropertyStore.add_fact"""
+        if self.found is not None:
+            self.found.append((name, objs, self.rule))
+        self.properties.add_fact(name, objs, self.rule)
+
+    def light(self) -> bool:
+        """
+        whether new objects are lightweight, in lazy mode the objects created inside construction functions are
+        they get negative ids, are not indexed and their properties are not checked, unless they are materialized
+        """
+        return self.lazy and self.depth > 0
+
+    def materialize(self, obj):
+        """gives an id to a lightweight object and indexes it, returns the already existing object instead if there is one"""
+        if obj.id >= 0:
+            return obj
+        index = (self.points, self.lines, self.circles)[obj.order]
+        existing = index.find(obj.key)
+        if existing is not None:
+            existing.recipe_parent_depth_set = True
+            self.touch(existing)
+            return existing
+        obj.id = self.count
+        self.count += 1
+        obj.reset_name()
+        self.register(obj)
+        self.touch(obj)
+        return obj
+
+    def register(self, obj):
+        """adds the object to the index and the columns of its kind, so that it is returned again if it is created again"""
+        (self.points, self.lines, self.circles)[obj.order].add(obj.key, obj)
+        obj.index = self.columns[obj.order].append(obj, obj.coordinates)
+
+    def __enter__(self):
+        self.tokens.append(current_context.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        current_context.reset(self.tokens.pop())
+
+# context of the figure being interpreted, the default one is used outside of a figure
+current_context = ContextVar("current_context", default=Context())
+
+def current() -> Context:
+    return current_context.get()
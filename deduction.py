@@ -0,0 +1,271 @@
+from collections import deque, defaultdict, Counter
+from itertools import combinations
+
+from properties import EquivalenceClasses
+
+def criteria(obj):
+    return obj.criteria()
+
+# dict[str, Rule], name -> rule
+rules = {}
+
+class Rule:
+    """
+    represents a deduction rule and is created when a rule (which is a function with the decorator @rule(...), it derives new facts from a newly derived fact) is defined
+
+    function: function
+        the actual function, called with the engine and the objects of the new fact
+    name: str
+        name of the function
+    triggers: list[str]
+        names of the properties whose new facts trigger the rule
+    """
+    def __init__(self, func, triggers):
+        self.function = func
+        self.name = self.function.__name__
+        self.triggers = list(triggers)
+
+    def __repr__(self):
+        return f"Rule {self.name} triggered by {', '.join(self.triggers)}"
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+# rule decorator
+def rule(*triggers):
+    def rule_decorator(func):
+        rules[func.__name__] = Rule(func, triggers)
+        return func
+    return rule_decorator
+
+class Deduction:
+    """
+    semi-naive forward chaining over the known properties
+
+    every fact is processed exactly once, when it is new, by the rules that it triggers
+    rules only look at the facts around the objects of the new fact through the adjacency indexes
+    so a fact that can not lead to anything new is never visited again
+
+    properties: PropertyStore
+        properties that the derived facts are added to, its adjacency maps are used for joining facts
+    agenda: deque[(str, tuple[Obj])]
+        facts that are not processed yet
+    corners: dict[frozenset[Line], Point]
+        perpendicular lines whose intersection point is known
+    rule, trigger: str, (str, tuple[Obj])
+        the rule being run and the fact that triggered it, recorded with the facts it derives in the provenance of the properties
+    """
+    def __init__(self, properties, rules=rules):
+        self.properties = properties
+        self.triggered = defaultdict(list)
+        for r in rules.values():
+            for trigger in r.triggers:
+                self.triggered[trigger].append(r)
+        self.agenda = deque()
+        self.corners = {}
+        self.rule = None
+        self.trigger = None
+
+    def add(self, name, objs, premises=()) -> bool:
+        """
+        adds a fact to the properties, it is put on the agenda if it is new
+        premises are the (name, objs) of the facts other than the trigger that the rule derived it from
+        """
+        prop = self.properties[name]
+        if isinstance(prop, EquivalenceClasses):
+            objs = tuple(sorted(set(objs), key=criteria))
+            if not prop.add(objs):
+                return False
+        else:
+            objs = tuple(sorted(objs, key=criteria))
+            if len(set(objs)) != len(objs) or objs in prop:
+                return False
+            prop.add(objs)
+        self.properties.provenance.record(name, objs, self.rule, (self.trigger, *premises), self.properties)
+        self.agenda.append((name, objs))
+        return True
+
+    def run(self):
+        """derives every fact that follows from the properties"""
+        for name, prop in self.properties.items():
+            facts = prop.all_classes() if isinstance(prop, EquivalenceClasses) else list(prop)
+            for objs in facts:
+                self.agenda.append((name, tuple(objs)))
+        while self.agenda:
+            name, objs = self.agenda.popleft()
+            for r in self.triggered[name]:
+                self.rule = r.name
+                self.trigger = (name, objs)
+                r(self, objs)
+
+# rules
+
+@rule("line parallel to line")
+def parallel_transitivity(engine, objs):
+    """uv parallel & uw parallel => vw parallel, uv parallel & uw perpendicular => vw perpendicular"""
+    u, v = objs
+    for x, y in ((u, v), (v, u)):
+        for w in list(engine.properties.parallel(x)):
+            if w is not y:
+                engine.add("line parallel to line", (y, w), [("line parallel to line", (x, w))])
+        for w in list(engine.properties.perpendicular(x)):
+            engine.add("line perpendicular to line", (y, w), [("line perpendicular to line", (x, w))])
+
+@rule("line perpendicular to line")
+def perpendicular_composition(engine, objs):
+    """uv perpendicular & uw perpendicular => vw parallel, uv perpendicular & uw parallel => vw perpendicular"""
+    u, v = objs
+    for x, y in ((u, v), (v, u)):
+        for w in list(engine.properties.perpendicular(x)):
+            if w is not y:
+                engine.add("line parallel to line", (y, w), [("line perpendicular to line", (x, w))])
+        for w in list(engine.properties.parallel(x)):
+            engine.add("line perpendicular to line", (y, w), [("line parallel to line", (x, w))])
+
+@rule("point on line")
+def collinear_from_point_on_line(engine, objs):
+    """au bu cu pl => abc collinear, au pl & bu pl & abc collinear => cu pl"""
+    a, u = objs
+    points = engine.properties.points_on_line(u)
+    engine.add("collinear points", points, [("point on line", (b, u)) for b in points if b is not a])
+    for b in list(points):
+        if b is not a:
+            for c in list(engine.properties["collinear points"].common_class(a, b)):
+                engine.add("point on line", (c, u), [("point on line", (b, u)), ("collinear points", (a, b, c))])
+
+@rule("collinear points")
+def point_on_line_from_collinear(engine, objs):
+    """au pl & bu pl & abc collinear => cu pl"""
+    members = engine.properties["collinear points"].common_class(*objs)
+    lines = Counter(u for a in members for u in engine.properties.lines_through_point(a))
+    for u, count in lines.items():
+        if count >= 2:
+            a, b = [a for a in members if a in engine.properties.points_on_line(u)][:2]
+            for c in list(members):
+                engine.add("point on line", (c, u), [("point on line", (a, u)), ("point on line", (b, u)), ("collinear points", (a, b, c))])
+
+@rule("point on line")
+def concurrent_from_point_on_line(engine, objs):
+    """au av aw pl => uvw concurrent, au pl & av pl & uvw concurrent => aw pl"""
+    a, u = objs
+    lines = engine.properties.lines_through_point(a)
+    engine.add("concurrent lines", lines, [("point on line", (a, v)) for v in lines if v is not u])
+    for v in list(lines):
+        if v is not u:
+            for w in list(engine.properties["concurrent lines"].common_class(u, v)):
+                engine.add("point on line", (a, w), [("point on line", (a, v)), ("concurrent lines", (u, v, w))])
+
+@rule("concurrent lines")
+def point_on_line_from_concurrent(engine, objs):
+    """au pl & av pl & uvw concurrent => aw pl"""
+    members = engine.properties["concurrent lines"].common_class(*objs)
+    points = Counter(a for u in members for a in engine.properties.points_on_line(u))
+    for a, count in points.items():
+        if count >= 2:
+            u, v = [u for u in members if u in engine.properties.lines_through_point(a)][:2]
+            for w in list(members):
+                engine.add("point on line", (a, w), [("point on line", (a, u)), ("point on line", (a, v)), ("concurrent lines", (u, v, w))])
+
+@rule("point on circle")
+def concyclic_from_point_on_circle(engine, objs):
+    """as bs cs ds pc => abcd concyclic, as bs cs pc & abcd concyclic => ds pc"""
+    a, s = objs
+    points = engine.properties.points_on_circle(s)
+    engine.add("concyclic points", points, [("point on circle", (b, s)) for b in points if b is not a])
+    if len(points) >= 3:
+        for b, c in combinations([b for b in points if b is not a], 2):
+            for d in list(engine.properties["concyclic points"].common_class(a, b, c)):
+                engine.add("point on circle", (d, s), [("point on circle", (b, s)), ("point on circle", (c, s)), ("concyclic points", (a, b, c, d))])
+
+@rule("concyclic points")
+def point_on_circle_from_concyclic(engine, objs):
+    """as bs cs pc & abcd concyclic => ds pc"""
+    members = engine.properties["concyclic points"].common_class(*objs)
+    circles = Counter(s for a in members for s in engine.properties.circles_through_point(a))
+    for s, count in circles.items():
+        if count >= 3:
+            a, b, c = [a for a in members if a in engine.properties.points_on_circle(s)][:3]
+            for d in list(members):
+                engine.add("point on circle", (d, s), [("point on circle", (a, s)), ("point on circle", (b, s)), ("point on circle", (c, s)), ("concyclic points", (a, b, c, d))])
+
+def intersection(engine, u, v):
+    """known intersection point of u and v, None if there is no such point"""
+    return next(iter(engine.properties.points_on_line(u) & engine.properties.points_on_line(v)), None)
+
+def add_corner(engine, u, v, a):
+    """abcd uvxy, uv perpendicular & xy perpendicular => abcd concyclic"""
+    engine.corners[frozenset((u, v))] = a
+    for corner, b in list(engine.corners.items()):
+        x, y = corner
+        if len({u, v, x, y}) != 4:
+            continue
+        for x, y in ((x, y), (y, x)):
+            c = intersection(engine, u, x)
+            d = intersection(engine, v, y)
+            if c is not None and d is not None:
+                engine.add("concyclic points", (a, b, c, d), [
+                    ("line perpendicular to line", (u, v)), ("line perpendicular to line", (x, y)),
+                    ("point on line", (a, u)), ("point on line", (a, v)), ("point on line", (b, x)), ("point on line", (b, y)),
+                    ("point on line", (c, u)), ("point on line", (c, x)), ("point on line", (d, v)), ("point on line", (d, y)),
+                ])
+
+@rule("line perpendicular to line")
+def concyclic_from_perpendicular(engine, objs):
+    """a right angle at the intersection of perpendicular lines"""
+    u, v = objs
+    a = intersection(engine, u, v)
+    if a is not None:
+        add_corner(engine, u, v, a)
+
+@rule("point on line")
+def concyclic_from_perpendicular_point(engine, objs):
+    """a new intersection point may complete a right angle or meet the lines of another one"""
+    a, u = objs
+    for v in list(engine.properties.perpendicular(u)):
+        if a in engine.properties.points_on_line(v) and frozenset((u, v)) not in engine.corners:
+            add_corner(engine, u, v, a)
+    for corner, b in list(engine.corners.items()):
+        if u in corner:
+            add_corner(engine, *corner, b)
+
+def tangency_at(engine, a, u, s, t):
+    """
+    u, s and t passing through the same point a
+    us lc & ut lc => st tangent, us lc & st tangent => ut lc
+    """
+    if s is t:
+        return
+    incidences = [("point on line", (a, u)), ("point on circle", (a, s)), ("point on circle", (a, t))]
+    for s, t in ((s, t), (t, s)):
+        if s in engine.properties.tangent_circles(u):
+            if t in engine.properties.tangent_circles(u):
+                engine.add("circle tangent to circle", (s, t), [("line tangent to circle", (u, s)), ("line tangent to circle", (u, t)), *incidences])
+            if t in engine.properties.tangent_circles(s):
+                engine.add("line tangent to circle", (u, t), [("line tangent to circle", (u, s)), ("circle tangent to circle", (s, t)), *incidences])
+
+@rule("line tangent to circle")
+def tangent_from_line_tangent(engine, objs):
+    u, s = objs
+    for a in list(engine.properties.points_on_line(u) & engine.properties.points_on_circle(s)):
+        for t in list(engine.properties.circles_through_point(a)):
+            tangency_at(engine, a, u, s, t)
+
+@rule("circle tangent to circle")
+def tangent_from_circle_tangent(engine, objs):
+    s, t = objs
+    for a in list(engine.properties.points_on_circle(s) & engine.properties.points_on_circle(t)):
+        for u in list(engine.properties.lines_through_point(a)):
+            tangency_at(engine, a, u, s, t)
+
+@rule("point on line", "point on circle")
+def tangent_from_incidence(engine, objs):
+    """both rules of tangency_at need a line and a circle through a that are tangent, so only those are tried"""
+    if not engine.properties["line tangent to circle"]:
+        return
+    a = objs[0]
+    lines = [objs[1]] if objs[1].order == 1 else list(engine.properties.lines_through_point(a))
+    circles = engine.properties.circles_through_point(a)
+    for u in lines:
+        for s in list(engine.properties.tangent_circles(u) & circles):
+            for t in list(circles):
+                tangency_at(engine, a, u, s, t)
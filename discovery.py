@@ -0,0 +1,406 @@
+from itertools import combinations
+from math import sqrt, floor, atan2, cos, sin, pi, log
+
+from spatial import EPSILON, SpatialIndex
+from objects import Line
+
+# candidates are found with a coarser tolerance than EPSILON and then confirmed by the actual check functions
+PRUNE = 1e-3
+# size of the cells of the points and of the buckets of the lines, about the radius of the small circles of the figures
+# also the radius below which the circles are in the first bin of the index of the circles, and the size of its cells
+CIRCLE_CELL = 0.25
+# number of the bins of the directions of the lines in the index of the lines
+ANGLE_BINS = 32
+# ratio of the largest and the smallest radius of a bin of the index of the circles
+RADIUS_RATIO = 2
+# (cos t, sin t) at the middle of every bin of the directions t in [0, pi)
+MIDDLES = [(cos((k + 0.5) * pi / ANGLE_BINS), sin((k + 0.5) * pi / ANGLE_BINS)) for k in range(ANGLE_BINS)]
+
+def criteria(obj):
+    return obj.criteria()
+
+def close(key1, key2):
+    return all(abs(k1 - k2) < PRUNE for k1, k2 in zip(key1, key2))
+
+def line_key(ax, ay, bx, by):
+    """normalized coefficients of the line through (ax, ay) and (bx, by), None if the points coincide"""
+    if abs(ax - bx) < EPSILON and abs(ay - by) < EPSILON:
+        return None
+    return Line.normalized(by - ay, ax - bx, ax * by - ay * bx)
+
+def circumcircle_key(a, b, c):
+    """(ox, oy, r) of the circle through a, b, c, None if they are (almost) collinear"""
+    d = 2 * (a.x * (b.y - c.y) + b.x * (c.y - a.y) + c.x * (a.y - b.y))
+    if abs(d) < EPSILON ** 2:
+        return None
+    a2 = a.x * a.x + a.y * a.y
+    b2 = b.x * b.x + b.y * b.y
+    c2 = c.x * c.x + c.y * c.y
+    ox = (a2 * (b.y - c.y) + b2 * (c.y - a.y) + c2 * (a.y - b.y)) / d
+    oy = (a2 * (c.x - b.x) + b2 * (a.x - c.x) + c2 * (b.x - a.x)) / d
+    return ox, oy, sqrt((a.x - ox) ** 2 + (a.y - oy) ** 2)
+
+def intersection_key(u, v):
+    """(x, y) of the intersection of the normalized lines u and v, None if they are (almost) parallel"""
+    d = u[0] * v[1] - u[1] * v[0]
+    if abs(d) < EPSILON:
+        return None
+    return (u[2] * v[1] - u[1] * v[2]) / d, (u[0] * v[2] - u[2] * v[0]) / d
+
+class Candidates(SpatialIndex):
+    """spatial index that keeps every object added, used for finding the objects with nearby keys"""
+    def __init__(self):
+        super().__init__(2 * PRUNE)
+
+    def near_items(self, key):
+        """keys and objects whose keys are possibly closer than PRUNE to the given key"""
+        for cell in self.neighbour_cells(key):
+            yield from self.cells.get(cell, ())
+
+    def near(self, key):
+        """objects whose keys are possibly closer than PRUNE to the given key"""
+        for _, obj in self.near_items(key):
+            yield obj
+
+class Grid:
+    """
+    objects bucketed by the cells of a square grid over their positions, used for finding the objects near a line or a circle
+
+    cells: dict[(int, int), list[Obj]]
+        objects in every cell
+    columns, rows: dict[int, set[int]]
+        rows of the cells in every column and columns of the cells in every row, only the cells with objects
+    size: int
+        number of objects
+    """
+    def __init__(self, cell_size=CIRCLE_CELL):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.columns = {}
+        self.rows = {}
+        self.size = 0
+
+    def add(self, x, y, obj):
+        i, j = floor(x / self.cell_size), floor(y / self.cell_size)
+        self.cells.setdefault((i, j), []).append(obj)
+        self.columns.setdefault(i, set()).add(j)
+        self.rows.setdefault(j, set()).add(i)
+        self.size += 1
+
+    def strip(self, key, width):
+        """
+        objects possibly closer than width to the line with the normalized coefficients key
+        the line is walked along the axis it is closer to, every column (or row) with objects is looked up only in the cells the line crosses
+        """
+        size = self.cell_size
+        na, nb, nc = key
+        if abs(nb) >= abs(na):
+            lanes, along, across, transpose = self.columns, na, nb, False
+        else:
+            lanes, along, across, transpose = self.rows, nb, na, True
+        margin = width / abs(across)
+        for i, occupied in lanes.items():
+            # the other coordinate of the line over the column (or row) i
+            y0, y1 = (nc - along * i * size) / across, (nc - along * (i + 1) * size) / across
+            low, high = floor((min(y0, y1) - margin) / size), floor((max(y0, y1) + margin) / size)
+            for j in (occupied if len(occupied) <= high - low else range(low, high + 1)):
+                if low <= j <= high and j in occupied:
+                    yield from self.cells[(j, i) if transpose else (i, j)]
+
+    def annulus(self, x, y, inner, outer):
+        """objects possibly between inner and outer away from (x, y), every object if there are fewer of them than the cells to look up"""
+        size = self.cell_size
+        xs = range(floor((x - outer) / size), floor((x + outer) / size) + 1)
+        ys = range(floor((y - outer) / size), floor((y + outer) / size) + 1)
+        if len(xs) * len(ys) >= self.size:
+            for objs in self.cells.values():
+                yield from objs
+            return
+        for i in xs:
+            for j in ys:
+                if (i, j) not in self.cells:
+                    continue
+                # nearest and farthest points of the cell to (x, y)
+                nx, ny = max(i * size - x, 0, x - (i + 1) * size), max(j * size - y, 0, y - (j + 1) * size)
+                fx, fy = max(abs(i * size - x), abs((i + 1) * size - x)), max(abs(j * size - y), abs((j + 1) * size - y))
+                if nx * nx + ny * ny <= outer * outer and fx * fx + fy * fy >= inner * inner:
+                    yield from self.cells[(i, j)]
+
+class LineBuckets:
+    """
+    lines bucketed by their normalized coefficients, used for finding the lines through a point or tangent to a circle
+    a line is stored with the sign that makes (a, b) = (cos t, sin t) for t in [0, pi), in the bin of t and the bucket of c
+    the residual of a point (x, y) on such a line, ax + by - c, is 0, and x cos t + y sin t changes by at most |(x, y)| dt,
+    so only the buckets of c near x cos t + y sin t at the middle of every bin are looked up instead of every line
+
+    bins: dict[int, dict[int, list[Line]]]
+        lines by the bins of t and the buckets of c
+    """
+    def __init__(self, cell_size=CIRCLE_CELL):
+        self.cell_size = cell_size
+        self.bins = {}
+
+    def add(self, key, u):
+        a, b, c = key
+        if b < 0 or (b == 0 and a < 0):
+            a, b, c = -a, -b, -c
+        k = min(floor(atan2(b, a) / pi * ANGLE_BINS), ANGLE_BINS - 1)
+        self.bins.setdefault(k, {}).setdefault(floor(c / self.cell_size), []).append(u)
+
+    def near(self, x, y, offset=0.0):
+        """lines whose residual at (x, y) is possibly closer than PRUNE to offset or -offset"""
+        size = self.cell_size
+        spread = sqrt(x * x + y * y) * pi / ANGLE_BINS / 2 + PRUNE
+        for k, buckets in self.bins.items():
+            ca, sa = MIDDLES[k]
+            middle = x * ca + y * sa
+            for d in {offset, -offset}:
+                for bucket in range(floor((middle - d - spread) / size), floor((middle - d + spread) / size) + 1):
+                    yield from buckets.get(bucket, ())
+
+class CircleIndex:
+    """
+    circles indexed by their radii and centers, used for finding the circles through a point, tangent to a line or to a circle
+    the circles are grouped into bins by their radii, [0, CIRCLE_CELL) and then [CIRCLE_CELL RADIUS_RATIO^k, CIRCLE_CELL RADIUS_RATIO^(k + 1)), and the circles in a bin into a grid by
+    their centers with cells as large as the smallest radius of the bin, so a circle meets about the same number of cells in every bin
+    and there are only a few bins for the circles of a figure
+    for a bin of the radii [R1, R2), the centers of the circles through a point are in an annulus around it,
+    the ones of the circles tangent to a line in a strip around it, and the ones of the circles tangent to a circle s in an annulus
+    around the center of s, where |o_s o_t| is close to r_s + r_t or to |r_s - r_t|, only the cells that meet them are looked up
+
+    bins: dict[int, (Grid, float, float)]
+        circles by the bins of their radii and the cells of their centers, together with the range of the radii of the bin
+    """
+    def __init__(self):
+        self.bins = {}
+
+    def add(self, s):
+        k = -1 if s.r < CIRCLE_CELL else floor(log(s.r / CIRCLE_CELL) / log(RADIUS_RATIO))
+        if k not in self.bins:
+            low, high = (0, CIRCLE_CELL) if k < 0 else (CIRCLE_CELL * RADIUS_RATIO ** k, CIRCLE_CELL * RADIUS_RATIO ** (k + 1))
+            self.bins[k] = (Grid(high - low), low, high)
+        self.bins[k][0].add(s.o.x, s.o.y, s)
+
+    def near_point(self, a):
+        """circles whose centers are possibly closer than PRUNE to r away from a"""
+        for grid, low, high in self.bins.values():
+            yield from grid.annulus(a.x, a.y, max(low - PRUNE, 0), high + PRUNE)
+
+    def near_line(self, key):
+        """circles whose centers are possibly closer than r + PRUNE to the line with the normalized coefficients key"""
+        for grid, low, high in self.bins.values():
+            yield from grid.strip(key, high + PRUNE)
+
+    def near_tangent(self, s):
+        """circles whose centers are possibly closer than PRUNE to r_s + r_t or |r_s - r_t| away from the center of s"""
+        for grid, low, high in self.bins.values():
+            # range of |r_s - r_t| for r_t in [low, high)
+            if low <= s.r <= high:
+                internal = (0, max(s.r - low, high - s.r))
+            else:
+                internal = tuple(sorted((abs(s.r - low), abs(s.r - high))))
+            for inner, outer in ((s.r + low, s.r + high), internal):
+                yield from grid.annulus(s.o.x, s.o.y, max(inner - PRUNE, 0), outer + PRUNE)
+
+class Discovery:
+    """
+    incremental property discovery
+
+    when an object is added, only the tuples that contain the new object and the objects added before are checked
+    instead of every tuple in the cartesian product of the objects
+    candidate tuples are pruned by cheap numerical filters and spatial indexes, and then confirmed by the check functions,
+    which add the property to the properties as usual
+    objects can also be added as already checked, e.g. by the numpy batch, they are indexed only when another object is added
+
+    check_functions: dict[str, CheckFunction]
+        the check functions that are used for confirming the candidates
+    points, lines, circles: list[Point], list[Line], list[Circle]
+        objects added so far
+    added: set[Obj]
+        objects added so far, including the unindexed ones
+    unindexed: list[Obj]
+        objects added as already checked that are not indexed yet
+    checking: bool
+        whether the candidates are checked, not while the unindexed objects are indexed
+    point_grid: Grid
+        points added so far by their positions
+    keys: dict[Line, tuple[float, float, float]]
+        normalized coefficients of the lines added so far
+    line_buckets: LineBuckets
+        lines added so far by their normalized coefficients
+    directions: Candidates
+        lines added so far keyed by their normalized direction
+    circumcircles: Candidates
+        points on the circumcircles of the triples of the points added so far, keyed by (ox, oy, r)
+        a circle through more than three of them is stored once with all of its points
+        in general position there is one for every triple, so it grows with the cube of the number of points
+    circle_index: CircleIndex
+        circles added so far by their radii and centers
+    """
+    def __init__(self, check_functions):
+        self.check_functions = check_functions
+        self.points = []
+        self.lines = []
+        self.circles = []
+        self.added = set()
+        self.unindexed = []
+        self.checking = True
+        self.point_grid = Grid()
+        self.keys = {}
+        self.line_buckets = LineBuckets()
+        self.directions = Candidates()
+        self.circumcircles = Candidates()
+        self.circle_index = CircleIndex()
+
+    def check(self, name, *args):
+        if not self.checking:
+            return False
+        return self.check_functions[name](*sorted(args, key=criteria))
+
+    def add_all(self, objects):
+        for obj in objects:
+            self.add(obj)
+
+    def add_checked(self, objects):
+        """adds objects whose properties with each other and with the objects added before are already found"""
+        for obj in objects:
+            if obj not in self.added:
+                self.added.add(obj)
+                self.unindexed.append(obj)
+
+    def add(self, obj):
+        if obj in self.added:
+            return
+        if self.unindexed:
+            unindexed, self.unindexed = self.unindexed, []
+            self.checking = False
+            try:
+                for other in unindexed:
+                    self.insert(other)
+            finally:
+                self.checking = True
+        self.added.add(obj)
+        self.insert(obj)
+
+    def insert(self, obj):
+        if obj.order == 0:
+            self.add_point(obj)
+        elif obj.order == 1:
+            self.add_line(obj)
+        else:
+            self.add_circle(obj)
+
+    def add_point(self, a):
+        # point on line, the lines whose residual buckets at a are near 0
+        # point on circle, the circles whose centers are about r away from a
+        for u in sorted(set(self.line_buckets.near(a.x, a.y)), key=criteria):
+            na, nb, nc = self.keys[u]
+            if abs(na * a.x + nb * a.y - nc) < PRUNE:
+                self.check("is_pl", a, u)
+        for s in sorted(set(self.circle_index.near_point(a)), key=criteria):
+            if abs(sqrt((a.x - s.o.x) ** 2 + (a.y - s.o.y) ** 2) - s.r) < PRUNE:
+                self.check("is_pc", a, s)
+
+        # collinear, the lines through a and the other points are compared
+        lines_through_a = Candidates()
+        for b in self.points:
+            key = line_key(a.x, a.y, b.x, b.y)
+            if key is None:
+                continue
+            for c in set(lines_through_a.near(key)) | set(lines_through_a.near(tuple(-k for k in key))):
+                self.check("is_collinear", a, b, c)
+            lines_through_a.add(key, b)
+
+        # concyclic, the circumcircles of a and the pairs of points are looked up in the circumcircles of the triples added before
+        # a circumcircle that is found is a circle through a and at least three other points, the pairs on it are not looked up again
+        # the others are added, so that the points added later are looked up in them
+        groups = {}
+        # ids of the circles through a found so far, for every point on them
+        circles_of = {}
+        for i, b in enumerate(self.points):
+            for c in self.points[:i]:
+                if b in circles_of and c in circles_of and circles_of[b] & circles_of[c]:
+                    continue
+                key = circumcircle_key(a, b, c)
+                if key is None:
+                    continue
+                group = next((g for k, g in self.circumcircles.near_items(key) if close(k, key)), None)
+                if group is None:
+                    self.circumcircles.add(key, [a, b, c])
+                    continue
+                # the circle may be added for a and another pair before
+                if a not in group:
+                    group.append(a)
+                groups[id(group)] = group
+                group.extend(obj for obj in (b, c) if obj not in group)
+                for obj in group:
+                    circles_of.setdefault(obj, set()).add(id(group))
+        checked = set()
+        for group in groups.values():
+            for triple in combinations(sorted((obj for obj in group if obj is not a), key=criteria), 3):
+                if triple not in checked:
+                    checked.add(triple)
+                    self.check("is_concyclic", a, *triple)
+
+        self.points.append(a)
+        self.point_grid.add(a.x, a.y, a)
+
+    def add_line(self, u):
+        key = Line.normalized(u.a, u.b, u.c)
+        na, nb, nc = key
+
+        # point on line, the points in the cells that u crosses
+        # line tangent to circle, the circles whose centers are about r away from u
+        for a in sorted(set(self.point_grid.strip(key, PRUNE)), key=criteria):
+            if abs(na * a.x + nb * a.y - nc) < PRUNE:
+                self.check("is_pl", a, u)
+        for s in sorted(set(self.circle_index.near_line(key)), key=criteria):
+            if abs(abs(na * s.o.x + nb * s.o.y - nc) - s.r) < PRUNE:
+                self.check("is_lc", u, s)
+
+        # parallel and perpendicular, lines are compared by their directions
+        parallel = set(self.directions.near((na, nb))) | set(self.directions.near((-na, -nb)))
+        perpendicular = set(self.directions.near((-nb, na))) | set(self.directions.near((nb, -na)))
+        parallel = [v for v in parallel if self.check("is_parallel", u, v)]
+        for v in perpendicular:
+            self.check("is_perpendicular", u, v)
+
+        # concurrent, the intersections of u with the other lines are compared
+        intersections = Candidates()
+        for v in self.lines:
+            i = intersection_key(key, self.keys[v])
+            if i is None:
+                continue
+            for w in intersections.near(i):
+                self.check("is_concurrent", u, v, w)
+            intersections.add(i, v)
+        # parallel lines are concurrent at infinity
+        for i, v in enumerate(parallel):
+            for w in parallel[:i]:
+                self.check("is_concurrent", u, v, w)
+
+        self.keys[u] = key
+        self.line_buckets.add(key, u)
+        self.directions.add((na, nb), u)
+        self.lines.append(u)
+
+    def add_circle(self, s):
+        # point on circle, the points in the cells about r away from the center
+        # line tangent to circle, the lines whose residual buckets at the center are near r
+        for a in sorted(set(self.point_grid.annulus(s.o.x, s.o.y, max(s.r - PRUNE, 0), s.r + PRUNE)), key=criteria):
+            if abs(sqrt((a.x - s.o.x) ** 2 + (a.y - s.o.y) ** 2) - s.r) < PRUNE:
+                self.check("is_pc", a, s)
+        for u in sorted(set(self.line_buckets.near(s.o.x, s.o.y, s.r)), key=criteria):
+            na, nb, nc = self.keys[u]
+            if abs(abs(na * s.o.x + nb * s.o.y - nc) - s.r) < PRUNE:
+                self.check("is_lc", u, s)
+
+        # tangent circles, only the circles found in the index whose centers are about r_s + r_t or |r_s - r_t| away are checked
+        # the check is not symmetric so both orders are tried
+        for t in sorted(set(self.circle_index.near_tangent(s)), key=criteria):
+            d = sqrt((s.o.x - t.o.x) ** 2 + (s.o.y - t.o.y) ** 2)
+            if self.checking and (abs(d - s.r - t.r) < PRUNE or abs(d - abs(s.r - t.r)) < PRUNE):
+                self.check_functions["is_tangent"](s, t) or self.check_functions["is_tangent"](t, s)
+
+        self.circles.append(s)
+        self.circle_index.add(s)
@@ -1,35 +1,15 @@
 from functools import wraps
-from itertools import product
 from inspect import signature
 from math import sqrt, atan, pi, sin, cos
-from random import random
 
 from objects import Obj, Point, Line, Circle
 from exceptions import FigureException
-
-# sets for properties that will be filled by the check functions
-point_on_line = set()
-point_on_circle = set()
-line_tangent_to_circle = set()
-line_perpendicular = set()
-line_parallel = set()
-circle_tangent_to_circle = set()
-collinear = set()
-concyclic = set()
-concurrent = set()
-
-# dictionary of the properties imported from main.py
-properties = {
-    "point on line": point_on_line,
-    "point on circle": point_on_circle,
-    "line tangent to circle": line_tangent_to_circle,
-    "line perpendicular to line": line_perpendicular,
-    "line parallel to line": line_parallel,
-    "circle tangent to circle": circle_tangent_to_circle,
-    "collinear points": collinear,
-    "concyclic points": concyclic,
-    "concurrent lines": concurrent,
-}
+from discovery import Discovery
+from properties import PropertyStore
+from context import current
+from spatial import EPSILON
+from predicates import robust_functions
+import vectorized
 
 # dict[str, ConstructionFunction], name -> function, imported from main.py
 construction_functions = {}
@@ -77,24 +57,81 @@ class ConstructionFunction:
     def __len__(self):
         return len(self.parameters)
 
+# check_everything evaluates the check functions in batch with numpy for at least this many objects
+BATCH_THRESHOLD = 50
+
 def check_everything(objects):
-    for check_function in check_functions.values():
-        for check_function_arguments in product(*[[x for x in objects if type(x) == cls] for cls in check_function.parameters]):
-            if len(set(check_function_arguments)) != len(check_function_arguments):
-                # not all different
-                continue
-            check_function(*check_function_arguments)
+    """
+    checks every property of the objects, only the candidate tuples found by the discovery engine are checked
+    for large sets of objects, all the candidate tuples are evaluated at once with numpy if it is installed, except in robust mode
+    """
+    objects = list(objects)
+    if len(objects) >= BATCH_THRESHOLD and vectorized.available() and not current().robust:
+        vectorized.check_everything_batch(objects, check_functions, current())
+    else:
+        Discovery(check_functions).add_all(objects)
+
+def check_figure(objects) -> PropertyStore:
+    """
+    checks every property of the objects with the discovery engine of the figure context, returns every property found so far
+    the objects that are checked before are not checked again, the new ones are checked against them and each other
+    check_everything uses a new engine for every call instead, since a construction call checks only its own objects
+    the first objects are checked in batch with numpy if there are enough of them, they are indexed only when more objects come
+    """
+    context = current()
+    if context.discovery is None:
+        context.discovery = Discovery(check_functions)
+    objects = [obj for obj in dict.fromkeys(objects) if obj not in context.discovery.added]
+    properties = context.properties
+    # the properties found are not added to the properties of the context, so that it keeps only the known ones
+    context.properties = context.discovered
+    try:
+        if not context.discovery.added and len(objects) >= BATCH_THRESHOLD and vectorized.available() and not context.robust:
+            vectorized.check_everything_batch(objects, check_functions, context)
+            context.discovery.add_checked(objects)
+        else:
+            context.discovery.add_all(objects)
+    finally:
+        context.properties = properties
+    return context.discovered
 
 # construction function decorator
-def construction_function():
+# the result of a deterministic function is memoized in the figure context by the ids of the arguments
+# so calling it again with the same objects returns the same objects without constructing and checking them again
+# in lazy mode, only the calls in the gfd lines are checked, and only if their results are in the figure (see Figure.check_pending)
+def construction_function(deterministic=True):
     def construction_function_decorator(func):
         @wraps(func)
         def checked_construction_function(*args, **kwargs):
-            result = func(*args, **kwargs)
+            context = current()
+            result = key = None
+            if deterministic:
+                key = (func.__name__, *(arg.id for arg in args))
+                result = context.memo.get(key)
+            memoized = result is not None
+
+            if not memoized:
+                context.depth += 1
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    context.depth -= 1
 
             # result is either a single Obj or a tuple of Objs, convert it to a list
             result_lst = list(result) if type(result) == tuple else [result]
 
+            if context.lazy and context.depth == 0:
+                # the results of a call in a gfd line may be added to the figure, so they are not lightweight
+                result_lst = [context.materialize(obj) for obj in result_lst]
+                result = tuple(result_lst) if type(result) == tuple else result_lst[0]
+
+            if memoized:
+                for obj in result_lst:
+                    context.touch(obj)
+                if context.lazy and context.depth == 0 and key not in context.checked:
+                    context.pending.append((func.__name__, key, args, result_lst))
+                return result
+
             for obj in result_lst:
                 if not obj.recipe_parent_depth_set:
                     obj.parents = args
@@ -102,8 +139,18 @@ def construction_function():
                     obj.depth = 1 + (max(map(lambda obj: obj.depth, args)) if args else -1)
 
             # for input and output objects, make every claim and check if true, this will be the known properties
-            combined = list(args) + result_lst
-            check_everything(combined)
+            if not context.lazy:
+                combined = list(args) + result_lst
+                rule = context.rule
+                context.rule = func.__name__
+                try:
+                    check_everything(combined)
+                finally:
+                    context.rule = rule
+            elif context.depth == 0:
+                context.pending.append((func.__name__, key, args, result_lst))
+            if deterministic:
+                context.memo[key] = result
             return result
         construction_functions[func.__name__] = ConstructionFunction(checked_construction_function)
         return checked_construction_function
@@ -119,11 +166,14 @@ class CheckFunction:
         name of the function
     parameters: list[Point/Line/Circle/Obj]
         parameter types of the function extracted from the signature
+    property_name: str
+        name of the property that the function fills in the properties of the figure context
     """
-    def __init__(self, func):
+    def __init__(self, func, property_name):
         self.function = func
         self.name = self.function.__name__
         self.parameters = [parameter_mapping[x] for x in signature(self.function).parameters]
+        self.property_name = property_name
     
     def __repr__(self):
         return f"Check Function {self.name} that takes {len(self)} parameters, {[cls.__name__ for cls in self.parameters]}"
@@ -134,21 +184,24 @@ class CheckFunction:
     def __len__(self):
         return len(self.parameters)
 
-# check function decorator
-def check_function(s):
+# check function decorator, satisfied properties are added to the property with the given name in the figure context
+# with the rule of the context, the construction function whose objects are being checked, as their provenance
+# in the robust mode of the context, the robust version of the function with the same name in predicates.py is evaluated instead
+def check_function(property_name):
     def check_function_decorator(func):
+        robust_func = robust_functions.get(func.__name__, func)
         @wraps(func)
         def inner(*args, **kwargs):
-            result = func(*args, **kwargs)
+            context = current()
+            result = (robust_func if context.robust else func)(*args, **kwargs)
             if result:
-                s.add(tuple(sorted(args, key=lambda obj: obj.criteria())))
+                context.add_fact(property_name, tuple(sorted(args, key=lambda obj: obj.criteria())))
             return result
-        check_functions[func.__name__] = CheckFunction(inner)
+        check_functions[func.__name__] = CheckFunction(inner, property_name)
         return inner
     return check_function_decorator
 
-# since we are dealing with computer floats, use epsilon instead of hard 0
-EPSILON = 1e-5
+# since we are dealing with computer floats, use epsilon instead of hard 0, EPSILON is imported from spatial.py
 
 # helper function
 def solve_quadratic(a, b, c) -> tuple[bool, int, float, float]:
@@ -178,6 +231,17 @@ def angle(u, v) -> float:
     x = u.a * v.a + u.b * v.b
     return abs(atan((v.a * u.b - u.a * v.b) / x)) if x else pi / 2
 
+def angle_ppp(a, b, c) -> float:
+    """angle between lines ab and ac, same as angle(line(a, b), line(a, c)) without constructing the lines"""
+    ua, ub = b.y - a.y, a.x - b.x
+    va, vb = c.y - a.y, a.x - c.x
+    x = ua * va + ub * vb
+    return abs(atan((va * ub - ua * vb) / x)) if x else pi / 2
+
+def distance_ppp(a, b, c) -> float:
+    """distance from a to line bc, same as distance_pl(a, line(b, c)) without constructing the line"""
+    return abs((c.y - b.y) * a.x + (b.x - c.x) * a.y - (b.x * c.y - b.y * c.x)) / distance_pp(b, c)
+
 def pc(a, s) -> int:
     """
     1  if a is outside of s
@@ -219,6 +283,10 @@ def cc(s, t) -> int:
         return 1
     return -1
 
+def random() -> float:
+    """random number in [0, 1) from the generator of the figure context, so that the figure is the same for the same seed"""
+    return current().random.random()
+
 def random_point_on_arc_angle(s, angle1, angle2, radian=True):
     """random point on circle s between angles a1 and a2"""
     k = 1 if radian else pi / 180
@@ -272,46 +340,46 @@ def unit_circle() -> Circle:
 
 ## random
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_point_on_circle(s) -> Point:
     """random point on circle s"""
     t = random() * 2 * pi
     return Point(s.o.x + s.r * cos(t), s.o.y + s.r * sin(t))
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_point_on_unit_circle() -> Point:
     """random point on unit circle"""
     return random_point_on_circle(unit_circle())
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_point_on_segment(a, b) -> Point:
     """random point on the line segment ab"""
     t = random()
     return Point(a.x + (b.x - a.x) * t, a.y + (b.y - a.y) * t)
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_point_on_arc(s, a, b):
     """random point on the arc ab of circle s, requires a and b to be on s"""
     if not is_pc(a, s) or not is_pc(b, s):
         raise FigureException(f"Points {a.name} or {b.name} is not on circle {s.name} in construction function random_point_on_arc")
     return random_point_on_arc_angle(s, angle_ps(a, s), angle_ps(b, s))
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_point() -> Point:
     """random point on unit circle"""
     return random_point_on_unit_circle()
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_line() -> Line:
     """random line passing through two random points on the unit circle"""
     return line(random_point(), random_point())
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_circle() -> Circle:
     """random circle whose center is on the unit circle and has a radius between 0 and 1"""
     return Circle(random_point(), random())
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_triangle_on_circle(s) -> tuple[Point, Point, Point]:
     """random triangle on circle s"""
     a = random_point_on_circle(s)
@@ -319,12 +387,12 @@ def random_triangle_on_circle(s) -> tuple[Point, Point, Point]:
     c = random_point_on_circle(s)
     return a, b, c
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_triangle_on_unit_circle() -> tuple[Point, Point, Point]:
     """random triangle on unit circle"""
     return random_triangle_on_circle(unit_circle())
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_nice_triangle() -> tuple[Point, Point, Point]:
     """random nice triangle, angles close to 60, 45, 75"""
     x = 5
@@ -333,7 +401,7 @@ def random_nice_triangle() -> tuple[Point, Point, Point]:
     c = random_point_on_arc_angle(unit_circle(), 330 - x, 330 + x, radian=False)
     return a, b, c
 
-@construction_function()
+@construction_function(deterministic=False)
 def random_line_through_point(a):
     """random line through point a"""
     b = random_point_on_circle(Circle(a, 1))
@@ -671,47 +739,47 @@ def midpoint_of_arc(a, b, s):
 
 # check functions
 
-@check_function(collinear)
+@check_function("collinear points")
 def is_collinear(a, b, c) -> bool:
     """a, b, c are collinear"""
-    return distance_pl(a, line(b, c)) < EPSILON
+    return distance_ppp(a, b, c) < EPSILON
 
-@check_function(concyclic)
+@check_function("concyclic points")
 def is_concyclic(a, b, c, d) -> bool:
     """a, b, c, d are concyclic"""
-    return abs(angle(line(a, b), line(a, c)) - angle(line(d, b), line(d, c))) < EPSILON and abs(angle(line(b, a), line(b, c)) - angle(line(d, a), line(d, c))) < EPSILON
+    return abs(angle_ppp(a, b, c) - angle_ppp(d, b, c)) < EPSILON and abs(angle_ppp(b, a, c) - angle_ppp(d, a, c)) < EPSILON
 
-@check_function(concurrent)
+@check_function("concurrent lines")
 def is_concurrent(u, v, w) -> bool:
     """u, v, w are concurrent"""
     return abs(u.a * v.c * w.b + u.b * v.a * w.c + u.c * v.b * w.a - u.a * v.b * w.c - u.b * v. c * w.a - u.c * v.a * w.b) < EPSILON
 
-@check_function(line_parallel)
+@check_function("line parallel to line")
 def is_parallel(u, v) -> bool:
     """u and v are parallel"""
     return angle(u, v) < EPSILON
 
-@check_function(line_perpendicular)
+@check_function("line perpendicular to line")
 def is_perpendicular(u, v) -> bool:
     """u and v are perpendicular"""
     return pi / 2 - angle(u, v) < EPSILON
 
-@check_function(circle_tangent_to_circle)
+@check_function("circle tangent to circle")
 def is_tangent(s, t) -> bool:
     """s and t are tangent"""
     return abs(distance_pc(s.o, t) - s.r) < EPSILON
 
-@check_function(point_on_line)
+@check_function("point on line")
 def is_pl(a, u) -> bool:
     """a is on u"""
     return distance_pl(a, u) < EPSILON
 
-@check_function(point_on_circle)
+@check_function("point on circle")
 def is_pc(a, s) -> bool:
     """a is on s"""
     return distance_pc(a, s) < EPSILON
 
-@check_function(line_tangent_to_circle)
+@check_function("line tangent to circle")
 def is_lc(u, s) -> bool:
     """u is tangent to s"""
     return abs(distance_pl(s.o, u) - s.r) < EPSILON
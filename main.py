@@ -1,175 +1,89 @@
-from sys import argv
-from itertools import combinations
-
-from functions import construction_functions, check_functions, properties, check_everything
+from sys import argv, exit
+from time import perf_counter
+from functools import wraps
+from os import path
+from difflib import SequenceMatcher
+from io import StringIO
+from json import dumps
+
+from functions import construction_functions, check_functions, check_everything, check_figure
 from exceptions import GFDException, FigureException
-from objects import Obj
-
-def total_properties():
-    return sum([len(prop) for prop in properties.values()])
-
-def check_trivial(objects):
+from objects import Obj, Layout
+from properties import EquivalenceClasses, PropertyStore
+from deduction import Deduction
+from context import Context
+from watch import watcher
+from cache import ResultCache, EXTENSIONS
+import vectorized
+import profiler
+
+# outputs that can be written next to the asy and txt files
+FORMATS = ("jsonl", "npz")
+# kind of the objects in the jsonl output, by order
+KINDS = ("point", "line", "circle")
+
+# asy template, relative to this file so that figures can be rendered from any working directory
+TEMPLATE = path.join(path.dirname(path.abspath(__file__)), "templates", "template.asy")
+
+def check_trivial(properties):
     """adds all trivial properties derived from existing known properties to the properties"""
-    old = total_properties()
-
-    while True:
-        check_trivial_perp_parallel(objects)
-        new = total_properties()
-        if old == new:
-            break
-        old = new
+    Deduction(properties).run()
 
-    while True:
-        check_trivial_collinear_pl(objects)
-        new = total_properties()
-        if old == new:
-            break
-        old = new
-    
-    check_trivial_concurrent(objects)
+def in_context(method):
+    """runs the method of the figure while its context is active"""
+    @wraps(method)
+    def inner(self, *args, **kwargs):
+        with self.context:
+            return method(self, *args, **kwargs)
+    return inner
 
-    while True:
-        check_trivial_concyclic_pc(objects)
-        new = total_properties()
-        if old == new:
-            break
-        old = new
-
-    while True:
-        check_trivial_tangent_lc(objects)
-        new = total_properties()
-        if old == new:
-            break
-        old = new
-
-def check_trivial_perp_parallel(objects):
-    for u in [obj for obj in objects if obj.order == 1]:
-        parallel = [[v for v in l2 if u.id != v.id][0] for l2 in properties["line parallel to line"] if u in l2]
-        perp = [[v for v in l2 if u.id != v.id][0] for l2 in properties["line perpendicular to line"] if u in l2]
-
-        # uv parallel & uw parallel => vw parallel
-        for v, w in combinations(parallel, 2):
-            properties["line parallel to line"].add(tuple(sorted([v, w], key=lambda o: o.criteria())))
-
-        # uv perpendicular & uw perpendicular => vw parallel
-        for v, w in combinations(perp, 2):
-            properties["line parallel to line"].add(tuple(sorted([v, w], key=lambda o: o.criteria())))
-        
-        # uv parallel & uw perpendicular => vw perpendicular
-        for v in parallel:
-            for w in perp:
-                properties["line perpendicular to line"].add(tuple(sorted([v, w], key=lambda o: o.criteria())))
-
-def check_trivial_collinear_pl(objects):
-    for u in [obj for obj in objects if obj.order == 1]:
-        points = [pl[0] for pl in properties["point on line"] if u in pl]
-
-        # au bu cu pl => abc collinear
-        for p3 in combinations(points, 3):
-            properties["collinear points"].add(tuple(sorted(p3, key=lambda o: o.criteria())))
-        
-        # au bu pl & abc collinear => cu pl
-        for a, b in combinations(points, 2):
-            for col in properties["collinear points"]:
-                if a in col and b in col:
-                    s = set(col)
-                    s.remove(a)
-                    s.remove(b)
-                    c = next(iter(s))
-                    properties["point on line"].add(tuple(sorted([c, u], key=lambda o: o.criteria())))
-    
-    # abc collinear & abd collinear => abcd collinear
-    for col1, col2 in combinations(properties["collinear points"], 2):
-        s = set(list(col1) + list(col2))
-        if len(s) == 4:
-            for p3 in combinations(s, 3):
-                properties["collinear points"].add(tuple(sorted(p3, key=lambda o: o.criteria())))
-
-def check_trivial_concurrent(objects):
-    for a in [obj for obj in objects if obj.order == 0]:
-        lines = [pl[1] for pl in properties["point on line"] if a in pl]
-
-        # au av aw pl => uvw concurrent
-        for l3 in combinations(lines, 3):
-            properties["concurrent lines"].add(tuple(sorted(l3, key=lambda o: o.criteria())))
-    
-    # uvw concurrent & uvx concurrent => uvwx concurrent
-    for con1, con2 in combinations(properties["concurrent lines"], 2):
-        s = set(list(con1) + list(con2))
-        if len(s) == 4:
-            for l3 in combinations(s, 3):
-                properties["concurrent lines"].add(tuple(sorted(l3, key=lambda o: o.criteria())))
-
-def check_trivial_concyclic_pc(objects):
-    for s in [obj for obj in objects if obj.order == 2]:
-        points = [pc[0] for pc in properties["point on circle"] if s in pc]
-
-        # as bs cs ds pc => abcd concyclic
-        for p4 in combinations(points, 4):
-            properties["concyclic points"].add(tuple(sorted(p4, key=lambda o: o.criteria())))
-        
-        # au bu pl & abc collinear => cu pl
-        for a, b, c in combinations(points, 3):
-            for con in properties["concyclic points"]:
-                if a in con and b in con and c in con:
-                    st = set(con)
-                    st.remove(a)
-                    st.remove(b)
-                    st.remove(c)
-                    d = next(iter(st))
-                    properties["point on circle"].add(tuple(sorted([d, s], key=lambda o: o.criteria())))
-        
-    # abcd uvwt, uv perpendicular & wt perpendicular => abcd concyclic
-    perp_lines_with_intersection_point = []
-    for ll in properties["line perpendicular to line"]:
-        points1 = [pl[0] for pl in properties["point on line"] if ll[0] in pl]
-        points2 = [pl[0] for pl in properties["point on line"] if ll[1] in pl]
-        intersection = [i for i in points1 if i in points2]
-        if intersection:
-            perp_lines_with_intersection_point.append([ll[0], ll[1], intersection[0]])
-    for u, v, a in perp_lines_with_intersection_point:
-        points_u = [pl[0] for pl in properties["point on line"] if u in pl]
-        points_v = [pl[0] for pl in properties["point on line"] if v in pl]
-        for x, y, b in perp_lines_with_intersection_point:
-            if len(set([u, v, x, y])) != 4:
-                continue
-            points_x = [pl[0] for pl in properties["point on line"] if x in pl]
-            points_y = [pl[0] for pl in properties["point on line"] if y in pl]
-            intersection_ux = [i for i in points_u if i in points_x]
-            intersection_uy = [i for i in points_u if i in points_y]
-            intersection_vx = [i for i in points_v if i in points_x]
-            intersection_vy = [i for i in points_v if i in points_y]
-            if intersection_ux and intersection_vy:
-                c = intersection_ux[0]
-                d = intersection_vy[0]
-                properties["concyclic points"].add(tuple(sorted([a, b, c, d], key=lambda o: o.criteria())))
-            if intersection_uy and intersection_vx:
-                c = intersection_uy[0]
-                d = intersection_vx[0]
-                properties["concyclic points"].add(tuple(sorted([a, b, c, d], key=lambda o: o.criteria())))
-        
-    # abcd concyclic & abce concyclic => abcde concyclic
-    for con1, con2 in combinations(properties["concyclic points"], 2):
-        s = set(list(con1) + list(con2))
-        if len(s) == 5:
-            for p4 in combinations(s, 4):
-                properties["concyclic points"].add(tuple(sorted(p4, key=lambda o: o.criteria())))
-        
-def check_trivial_tangent_lc(objects):
-    for u in [obj for obj in objects if obj.order == 1]:
-        points = [pl[0] for pl in properties["point on line"] if u in pl]
-        
-        for a in points:
-            a_circles = [pc[1] for pc in properties["point on circle"] if a in pc]
-            for s, t in combinations(a_circles, 2):
-                if (u, s) in properties["line tangent to circle"]:
-                    # au pl & as pc & at pc & us lc & ut lc => st tangent
-                    if (u, t) in properties["line tangent to circle"]:
-                        properties["circle tangent to circle"].add(tuple(sorted([s, t], key=lambda o: o.criteria())))
-
-                    # au pl & as pc & at pc & st tangent & us lc => ut lc
-                    if tuple(sorted([s, t], key=lambda o: o.criteria())) in properties["circle tangent to circle"]:
-                        properties["line tangent to line"].add((u, t))
+class Statement:
+    """
+    a line of the main gfd file together with what it did, recorded so that the figure can be updated when the file is edited
+
+    line: str
+        the gfd line
+    created: list[Obj]
+        objects created while interpreting the line, including the ones that are not in the figure
+    used: set[Obj]
+        already existing objects that the line used
+    names: dict[str, Obj]
+        objects that the line added to the figure
+    facts: list[(str, tuple[Obj], str)]
+        properties found by the check functions while interpreting the line, with their rules, including the already known ones
+    functions: dict[str, (int, list[str])]
+        custom functions that the line defined
+    references: set[str]
+        names of the objects and custom functions that the line used
+    sources: dict[str, str]
+        contents of the files imported by the line
+    random_states: (tuple, tuple)
+        states of the random generator of the figure before and after the line, None if the line did not change it
+    """
+    def __init__(self, line):
+        self.line = line
+        self.created = []
+        self.used = set()
+        self.names = {}
+        self.facts = []
+        self.functions = {}
+        self.references = set()
+        self.sources = {}
+        self.random_states = None
+
+    def __repr__(self):
+        return f"Statement {self.line}"
+
+    def changed_sources(self) -> bool:
+        """whether any of the imported files is changed since the line is interpreted"""
+        for filename, source in self.sources.items():
+            try:
+                with open(filename, "r") as file:
+                    if file.read() != source:
+                        return True
+            except OSError:
+                return True
+        return False
 
 class Figure:
     """
@@ -182,36 +96,223 @@ class Figure:
     line_counters: list[(str, int)]
         stores the stack for the imported files
         last element is the current file being interpreted and line number
+    context: Context
+        objects and properties of this figure, independent of the other figures in the process
+    statements: list[Statement]
+        lines of the main gfd file, used by update to interpret only the changed lines
+    statement: Statement
+        the statement being interpreted, None if the lines are not recorded
+    positions: dict[Obj, int]
+        position of every object in objects, used for comparing the properties of different instances of the figure
+    seed: int
+        seed of the random construction functions, seed lines in the gfd file are ignored if it is given
+    random_state: tuple
+        initial state of the random generator of the figure, update starts from it again so that the random construction functions
+        give the same objects as interpreting the file from the start
+    lazy: bool
+        whether the objects that are not in the figure are lightweight, they do not get ids and their properties are not checked
+        it is faster, but the properties that are known only through such objects become unknown
+    formats: tuple[str]
+        outputs written next to the asy and txt files, from FORMATS
+    robust: bool
+        whether the properties are checked exactly, so that the ones that are closer to EPSILON than float errors are decided correctly
+        slower than checking with floats, see predicates.py
     """
-    def __init__(self):
+    def __init__(self, seed=None, lazy=False, formats=(), robust=False):
         self.objects = {}
         self.custom_functions = {}
 
         self.line_counters = []
-
-    def interpret(self, filename):
-        """starting point"""
+        self.seed = seed
+        self.lazy = lazy
+        self.formats = tuple(formats)
+        self.robust = robust
+        self.context = Context(seed, lazy, robust)
+        self.random_state = self.context.random.getstate()
+
+        self.statements = []
+        self.statement = None
+        self.positions = None
+
+    @in_context
+    def interpret(self, filename, cache=None) -> bool:
+        """
+        starting point
+        if cache (ResultCache) is given and the figure is rendered before, the outputs are copied from it without interpreting the file
+        returns whether the outputs are copied from the cache
+        """
+        if cache is not None:
+            key = cache.key(filename, self.seed, self.robust, self.lazy)
+            extensions = EXTENSIONS + tuple(f".{output_format}" for output_format in self.formats)
+            if cache.get(key, filename, extensions):
+                return True
         self.interpret_file(filename)
-
+        self.write(filename)
+        if cache is not None:
+            cache.put(key, filename, extensions)
+        if profiler.active is not None:
+            profiler.active.report()
+        return False
+
+    @in_context
+    def write(self, filename):
+        """writes the asy and txt files of the figure next to the gfd file, and the ones of the other formats of the figure"""
         with open(f"{filename[:-4]}.asy", "w+") as file:
-            file.write(self.asy())
+            self.write_asy(file)
 
+        check_trivial(self.context.properties)
+        checked_properties = self.checked_properties()
         with open(f"{filename[:-4]}.txt", "w+") as file:
-            file.write(self.txt())
+            self.write_sections(file, self.known_tuples(), self.unknown_tuples(checked_properties))
+
+        if "jsonl" in self.formats:
+            with open(f"{filename[:-4]}.jsonl", "w+") as file:
+                self.write_records(file, self.known_tuples(), self.unknown_tuples(checked_properties))
+
+        if "npz" in self.formats:
+            self.write_npz(f"{filename[:-4]}.npz")
+
+    @in_context
+    def run(self, program):
+        """runs a compiled gfd program (see compiler.py), same as interpreting the file it is compiled from"""
+        program.run(self)
 
+    @in_context
     def interpret_file(self, filename):
         """interprets a gfd file"""
         if filename in map(lambda x: x[0], self.line_counters):
             raise GFDException("circular import is not allowed", *self.line_counters[-1])
+        with open(filename, "r") as file:
+            source = file.read()
+        if self.statement is not None:
+            self.statement.sources[filename] = source
+        self.interpret_source(source, filename)
+
+    @in_context
+    def interpret_source(self, source, filename="<source>"):
+        """interprets gfd source that is not read from a file, filename is only used in the errors"""
         self.line_counters.append([filename, 0])
 
-        with open(filename, "r+") as file:
-            for line in file.read().splitlines():
-                self.line_counters[-1][1] += 1
+        for line in source.splitlines():
+            self.line_counters[-1][1] += 1
+            if len(self.line_counters) == 1:
+                self.interpret_statement(line)
+            else:
                 self.interpret_line(line)
 
         self.line_counters.pop()
+
+    def interpret_statement(self, line):
+        """interprets a line of the main gfd file and records it in the statements"""
+        self.statement = Statement(line)
+        self.context.log = []
+        self.context.found = self.statement.facts
+        count = self.context.count
+        random_state = self.context.random.getstate()
+        try:
+            self.interpret_line(line)
+        finally:
+            if self.context.random.getstate() != random_state:
+                self.statement.random_states = (random_state, self.context.random.getstate())
+            for obj in dict.fromkeys(self.context.log):
+                if obj.id >= count:
+                    self.statement.created.append(obj)
+                elif obj.id >= 0:
+                    self.statement.used.add(obj)
+            self.statements.append(self.statement)
+            self.statement = None
+            self.context.log = None
+            self.context.found = None
+
+    def imported_files(self) -> set[str]:
+        """files imported by the main gfd file, directly or not"""
+        return {filename for statement in self.statements for filename in statement.sources}
+
+    def update(self, filename):
+        """
+        interprets the edited gfd file again and writes the asy and txt files
+        only the changed lines and the lines depending on them are interpreted, the objects of the other lines are kept
+        with the properties that their lines found, the derived properties are derived again so nothing follows from removed lines
+        a line depends on the lines that created the objects and defined the custom functions it uses, and on the files it imports
+        a kept line that uses the random generator is kept only if the generator is in the same state before it as before,
+        otherwise the whole file is interpreted again, so that the figure is the same as interpreting the edited file from the start
+        """
+        with open(filename, "r") as file:
+            lines = file.read().splitlines()
+        old_statements = self.statements
+        old_lines = [statement.line for statement in old_statements]
+
+        # unchanged lines, new line index -> old statement
+        matched = {}
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, lines, autojunk=False).get_opcodes():
+            if tag == "equal":
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    matched[j] = old_statements[i]
+
+        # statements that are kept, the others are interpreted again
+        kept = set(matched.values())
+        owner = {}
+        definer = {}
+        for statement in old_statements:
+            if (statement not in kept
+                or statement.changed_sources()
+                or any(owner.get(obj) not in kept for obj in statement.used if obj in owner)
+                or any(definer[name] not in kept for name in statement.references if name in definer)):
+                kept.discard(statement)
+            for obj in statement.created:
+                owner[obj] = statement
+            for name in list(statement.names) + list(statement.functions):
+                definer[name] = statement
+
+        # new context with the objects of the kept statements and the properties that they found
+        context = Context(lazy=self.lazy, robust=self.robust)
+        context.count = self.context.count
+        context.random.setstate(self.random_state)
+        for statement in old_statements:
+            if statement in kept:
+                for obj in statement.created:
+                    obj.reset_name()
+                    context.register(obj)
+                for name, objs, rule in statement.facts:
+                    context.properties.add_fact(name, objs, rule)
+
+        self.context = context
+        self.objects = {}
+        self.custom_functions = {}
+        self.statements = []
+        self.line_counters = [[filename, 0]]
+        try:
+            with self.context:
+                for j, line in enumerate(lines):
+                    self.line_counters[-1][1] = j + 1
+                    statement = matched.get(j)
+                    if statement in kept:
+                        if statement.random_states is not None:
+                            before, after = statement.random_states
+                            if self.context.random.getstate() != before:
+                                # the random construction functions of the line would give different objects now
+                                break
+                            self.context.random.setstate(after)
+                        for name, obj in statement.names.items():
+                            self.bind(name, obj)
+                        self.custom_functions.update(statement.functions)
+                        self.statements.append(statement)
+                    else:
+                        self.interpret_statement(line)
+                else:
+                    self.line_counters.pop()
+                    self.write(filename)
+                    return
+        except GFDException:
+            # the error may be caused by the order of the kept lines, the whole file is interpreted to get the actual one
+            pass
+        random_state = self.random_state
+        self.__init__(self.seed, self.lazy, self.formats, self.robust)
+        self.context.random.setstate(random_state)
+        self.random_state = random_state
+        self.interpret(filename)
     
+    @in_context
     def interpret_line(self, line):
         """interprets a gfd line"""
         tokens = line.split()
@@ -226,8 +327,28 @@ class Figure:
             self.interpret_check(tokens[1:])
         elif tokens[0] == ">":
             self.interpret_function(tokens[1:])
+        elif tokens[0] == "@":
+            self.interpret_seed(tokens[1:])
         else:
             self.interpret_construction(tokens)
+        self.check_pending()
+
+    def check_pending(self):
+        """in lazy mode, checks the construction function calls of the line whose results are in the figure"""
+        pending = self.context.pending
+        if not pending:
+            return
+        objects = set(self.objects.values())
+        for name, key, args, results in pending:
+            if any(obj in objects for obj in results):
+                self.context.rule = name
+                try:
+                    check_everything(list(args) + results)
+                finally:
+                    self.context.rule = "check"
+                if key is not None:
+                    self.context.checked.add(key)
+        pending.clear()
     
     def interpret_check(self, tokens):
         """
@@ -242,6 +363,16 @@ class Figure:
             raise GFDException("non bool result for check line", *self.line_counters[-1])
         print(result)
 
+    def interpret_seed(self, tokens):
+        """
+        interprets a seed line in a gfd line, the random construction functions after it are seeded with the seed
+        @ <seed>
+        """
+        if len(tokens) != 1 or not tokens[0].lstrip("-").isdigit():
+            raise GFDException("seed line should have a single integer seed", *self.line_counters[-1])
+        if self.seed is None:
+            self.context.random.seed(int(tokens[0]))
+
     def interpret_function(self, tokens):
         """
         interprets a function definition in a gfd line
@@ -257,6 +388,8 @@ class Figure:
         function_name = tokens[1]
         function_body = tokens[3:]
         self.custom_functions[function_name] = (parameter_count, function_body)
+        if self.statement is not None:
+            self.statement.functions[function_name] = (parameter_count, function_body)
 
     def interpret_construction(self, tokens):
         """
@@ -275,12 +408,18 @@ class Figure:
         for variable_name, obj in zip(lhs, rhs):
             if variable_name == ".":
                 continue
-            if variable_name in self.objects:
-                raise GFDException(f"{variable_name} is already defined", *self.line_counters[-1])
             if not issubclass(type(obj), Obj):
                 raise GFDException(f"not Obj ({type(obj)}) return in expression", *self.line_counters[-1])
-            obj.name = variable_name
-            self.objects[variable_name] = obj
+            self.bind(variable_name, obj)
+
+    def bind(self, name, obj):
+        """adds the object to the figure with the name"""
+        if name in self.objects:
+            raise GFDException(f"{name} is already defined", *self.line_counters[-1])
+        obj.name = name
+        self.objects[name] = obj
+        if self.statement is not None:
+            self.statement.names[name] = obj
     
     def interpret_expression(self, expression):
         """interpret an expression consisting of object names and function names in postfix"""
@@ -289,15 +428,22 @@ class Figure:
             self.update_stack(stack, token)
         return stack
     
-    def update_stack(self, stack, token):
-        """updates stack based on the token in an expression"""
+    def update_stack(self, stack, token, arguments=()):
+        """
+        updates stack based on the token in an expression
+        arguments are the objects given to the custom function whose body is being interpreted, used for $i
+        they are used as they are, not by their names, so that the objects without a name can be given too, same as in compiler.py
+        """
         add_to_figure = False
         if "*" in token:
             # output is included in the figure
             add_to_figure = True
             token = token[:token.index("*")]
 
-        if token in construction_functions:
+        if token.startswith("$") and token[1:].isdigit() and 0 < int(token[1:]) <= len(arguments):
+            stack.append(arguments[int(token[1:]) - 1])
+
+        elif token in construction_functions:
             construction_function = construction_functions[token]
 
             args = []
@@ -327,6 +473,8 @@ class Figure:
             if add_to_figure:
                 for obj in result_lst:
                     self.objects[obj.name] = obj
+                    if self.statement is not None:
+                        self.statement.names[obj.name] = obj
 
             stack.extend(result_lst)
 
@@ -352,80 +500,292 @@ class Figure:
             stack.append(result)
 
         elif token in self.custom_functions.keys():
+            if self.statement is not None:
+                self.statement.references.add(token)
             parameter_count, function_body = self.custom_functions[token]
-            parameters = [stack.pop().name for _ in range(parameter_count)][::-1]
+            parameters = [stack.pop() for _ in range(parameter_count)][::-1]
             for subtoken in function_body:
-                if subtoken.startswith("$"):
-                    subtoken = parameters[int(subtoken[1:]) - 1]
-                self.update_stack(stack, subtoken)
+                self.update_stack(stack, subtoken, parameters)
 
         elif token in self.objects:
+            if self.statement is not None:
+                self.statement.references.add(token)
             stack.append(self.objects[token])
             
         else:
             raise GFDException(f"{token} is not defined", *self.line_counters[-1])
 
+    @in_context
     def asy(self) -> str:
         """asy string of the figure"""
+        file = StringIO()
+        self.write_asy(file)
+        return file.getvalue()
+
+    @in_context
+    def write_asy(self, file):
+        """writes the asy of the figure to the file line by line"""
         # plc denotes if the objects should be labeled
         plc = {"p": True, "l": False, "c": False}
         sorted_objects = sorted(self.objects.values(), key=lambda obj: obj.criteria())
+        layout = Layout(self.context.properties, sorted_objects)
         for obj in sorted_objects:
             if obj.order == 0:
-                obj.set_dir(properties, sorted_objects)
+                obj.set_dir(layout)
             if obj.order == 1:
-                obj.set_lm_rm(properties, sorted_objects)
-        definitions = "\n".join([obj.asy_definition() for obj in sorted_objects])
-        draws = "\n".join([obj.asy_draw(plc) for obj in sorted_objects])
-        with open("templates/template.asy", "r+") as file:
-            template = file.read().replace("FIGURE", definitions + "\n\n" + draws)
-        return template
-    
-    def properties_txt(self, properties_dct):
-        s = ""
+                obj.set_lm_rm(layout)
+        before, after = load_template()
+        file.write(before)
+        write_lines(file, (obj.asy_definition() for obj in sorted_objects))
+        file.write("\n\n")
+        write_lines(file, (obj.asy_draw(plc) for obj in sorted_objects))
+        file.write(after)
+
+    def write_properties(self, file, properties_dct):
         for name, prop in properties_dct.items():
-            t = f"{name}\n"
+            file.write(f"{name}\n")
             for objs in prop:
-                if any([obj not in self.objects.values() for obj in objs]):
-                    continue
-                t += f"    {', '.join(map(lambda obj: obj.name, objs))}\n"
-            t += "\n"
-            s += t
-        return s
+                file.write(f"    {', '.join(map(lambda obj: obj.name, objs))}\n")
+            file.write("\n")
+
+    def figure_tuples(self, prop, objects=None):
+        """tuples of the property whose objects are all in the figure"""
+        if objects is None:
+            objects = set(self.objects.values())
+        if isinstance(prop, EquivalenceClasses):
+            return prop.tuples(objects)
+        return (objs for objs in prop if all(obj in objects for obj in objs))
     
-    def txt(self) -> str:
-        """explanations of the figure"""
-        s = ""
-        s += "Object in the Figure\n"
-        for obj_name, obj in self.objects.items():
-            s += f"    {obj_name}: {obj}\n"
+    @in_context
+    def split_properties(self) -> tuple[dict, dict]:
+        """known and unknown properties of the objects in the figure, mapping from property names to lists of tuples"""
+        return self.known_properties(), self.unknown_properties()
+
+    @in_context
+    def known_properties(self) -> dict:
+        """adds the trivial properties to the known properties, returns the ones of the objects in the figure"""
+        check_trivial(self.context.properties)
+        return {pname: list(tuples) for pname, tuples in self.known_tuples().items()}
+
+    @in_context
+    def unknown_properties(self) -> dict:
+        """properties of the objects in the figure found by checking everything that are not known, known_properties is called before"""
+        return {pname: list(tuples) for pname, tuples in self.unknown_tuples(self.checked_properties()).items()}
+
+    @in_context
+    def checked_properties(self) -> PropertyStore:
+        """properties of the objects in the figure found by checking everything, see check_figure"""
+        return check_figure(self.objects.values())
+
+    def known_tuples(self) -> dict:
+        """generators of the known tuples of the objects in the figure, by property name"""
+        objects = set(self.objects.values())
+        return {pname: self.figure_tuples(p, objects) for pname, p in self.context.properties.items()}
+
+    def unknown_tuples(self, checked_properties, verified=None) -> dict:
+        """
+        generators of the tuples of the objects in the figure in checked_properties that are not known, by property name
+        if verified (dict[str, set[tuple[int]]], see facts) is given, only the ones in it
+        """
+        objects = set(self.objects.values())
+        known_properties = self.context.properties
+        def tuples(pname):
+            for objs in self.figure_tuples(checked_properties[pname], objects):
+                if objs not in known_properties[pname] and (verified is None or self.fact_key(objs) in verified[pname]):
+                    yield objs
+        return {pname: tuples(pname) for pname in checked_properties}
+
+    @in_context
+    def derivation(self, pname, objs) -> list[tuple]:
+        """
+        how a known property of the objects is found, read from the provenance of the properties, see Provenance.derivation
+        None if it is not known, the properties derived by check_trivial are known after known_properties or write is called
+        """
+        objs = tuple(sorted(objs, key=lambda obj: obj.criteria()))
+        if objs not in self.context.properties[pname]:
+            return None
+        return self.context.properties.derivation(pname, objs)
 
-        check_trivial(self.objects.values())
-        known_properties = {}
-        for pname, p in properties.items():
-            known_properties[pname] = p.copy()
+    def fact_key(self, objs) -> tuple[int]:
+        """
+        positions of the objects of a property tuple in the figure, independent of the order of the objects
+        unlike ids and the names of the starred objects, they are the same in every instance of the figure
+        """
+        if self.positions is None or len(self.positions) != len(self.objects):
+            self.positions = {obj: i for i, obj in enumerate(self.objects.values())}
+        return tuple(sorted(self.positions[obj] for obj in objs))
 
-        s += "\nKnown Properties of All Objects\n"
-        s += self.properties_txt(known_properties)
+    def facts(self) -> dict[str, set[tuple[int]]]:
+        """every property of the objects in the figure, by fact_key so that it can be compared with other instances of the figure"""
+        known_tuples, unknown_tuples = self.split_properties()
+        return {pname: {self.fact_key(objs) for objs in known_tuples[pname] + unknown_tuples[pname]} for pname in known_tuples}
 
-        check_everything(self.objects.values())
-        all_properties = {}
-        for pname, p in properties.items():
-            all_properties[pname] = p.copy()
+    @in_context
+    def txt(self, verified=None) -> str:
+        """
+        explanations of the figure
+        if verified (dict[str, set[tuple[int]]], see facts) is given, only the unknown properties in it are included
+        """
+        file = StringIO()
+        self.write_txt(file, verified)
+        return file.getvalue()
+
+    @in_context
+    def write_txt(self, file, verified=None):
+        """writes the txt of the figure to the file, the properties are written as they are found without collecting them"""
+        check_trivial(self.context.properties)
+        known_tuples = self.known_tuples()
+        # checked before writing anything, since the known tuples are read from the properties of the context
+        unknown_tuples = self.unknown_tuples(self.checked_properties(), verified)
+        self.write_sections(file, known_tuples, unknown_tuples)
+
+    def format_txt(self, known_properties, unknown_properties) -> str:
+        """txt of the figure with the given known and unknown properties"""
+        file = StringIO()
+        self.write_sections(file, known_properties, unknown_properties)
+        return file.getvalue()
+
+    def write_sections(self, file, known_properties, unknown_properties):
+        file.write("Object in the Figure\n")
+        for obj_name, obj in self.objects.items():
+            file.write(f"    {obj_name}: {obj}\n")
 
-        for name, st in all_properties.items():
-            for known in known_properties[name]:
-                assert known in st
-                st.remove(known)
+        file.write("\nKnown Properties of All Objects\n")
+        self.write_properties(file, known_properties)
 
-        s += "\nUnknown Properties of All Objects\n"
-        s += self.properties_txt(all_properties)
+        file.write("\nUnknown Properties of All Objects\n")
+        self.write_properties(file, unknown_properties)
 
-        return s
+    @in_context
+    def write_jsonl(self, file, verified=None):
+        """
+        writes the objects and the properties of the figure to the file as json lines, for the programs that use the figure
+        an object is {"type": "object", "id", "name", "kind", "coordinates", "recipe", "parents", "depth", "in_figure"}
+        the objects in the figure are written together with the objects they are constructed from, so every parent id is written
+        a property is {"type": "fact", "predicate", "objects", "known"}, with the ids of its objects
+        if verified is given, only the unknown properties in it are included, see txt
+        """
+        check_trivial(self.context.properties)
+        known_tuples = self.known_tuples()
+        unknown_tuples = self.unknown_tuples(self.checked_properties(), verified)
+        self.write_records(file, known_tuples, unknown_tuples)
+
+    def write_records(self, file, known_properties, unknown_properties):
+        objects = set(self.objects.values())
+        for obj in self.exported_objects():
+            file.write(dumps({
+                "type": "object",
+                "id": obj.id,
+                "name": obj.name,
+                "kind": KINDS[obj.order],
+                "coordinates": list(obj.coordinates),
+                "recipe": obj.recipe,
+                "parents": [parent.id for parent in obj.parents],
+                "depth": obj.depth,
+                "in_figure": obj in objects,
+            }, separators=(",", ":")) + "\n")
+        for known, properties in ((True, known_properties), (False, unknown_properties)):
+            for pname, tuples in properties.items():
+                for objs in tuples:
+                    file.write(dumps({"type": "fact", "predicate": pname, "objects": [obj.id for obj in objs], "known": known}, separators=(",", ":")) + "\n")
+
+    @in_context
+    def write_npz(self, filename):
+        """writes the ids, names and coordinates of the objects written by write_jsonl to a npz file, needs numpy"""
+        if not vectorized.available():
+            raise GFDException("numpy is needed for the npz output")
+        vectorized.save_coordinates(filename, self.exported_objects())
+
+    def exported_objects(self) -> list[Obj]:
+        """objects in the figure and the objects they are constructed from, directly or not, sorted by criteria"""
+        objects = set()
+        pending = list(self.objects.values())
+        while pending:
+            obj = pending.pop()
+            if obj not in objects:
+                objects.add(obj)
+                pending.extend(obj.parents)
+        return sorted(objects, key=lambda obj: obj.criteria())
+
+template = None
+
+def load_template() -> tuple[str, str]:
+    """asy template split at the place of the figure, read only once"""
+    global template
+    if template is None:
+        with open(TEMPLATE, "r") as file:
+            template = tuple(file.read().split("FIGURE", 1))
+    return template
+
+def write_lines(file, lines):
+    """writes the lines separated by new lines, without joining them"""
+    for i, line in enumerate(lines):
+        if i:
+            file.write("\n")
+        file.write(line)
+
+def watch(filename, seed=None, lazy=False, formats=(), robust=False):
+    """renders the gfd file and renders it again whenever it or the files it imports are changed, until interrupted"""
+    files_watcher = watcher()
+    figure = Figure(seed, lazy, formats, robust)
+    files = {filename}
+    while True:
+        start = perf_counter()
+        try:
+            if figure.statements:
+                figure.update(filename)
+            else:
+                figure.interpret(filename)
+            files = {filename} | figure.imported_files()
+            print(f"rendered {filename} in {(perf_counter() - start) * 1000:.1f} ms")
+        except GFDException as e:
+            print(e)
+            figure = Figure(seed, lazy, formats, robust)
+        except Exception as e:
+            # errors that are not reported as gfd errors, like a line through two equal points, should not end the session either
+            print(f"{type(e).__name__}: {e}")
+            figure = Figure(seed, lazy, formats, robust)
+        try:
+            files_watcher.wait(files)
+        except KeyboardInterrupt:
+            return
+
+def usage():
+    print("usage: python main.py [--watch] [--cache] [--lazy] [--robust] [--profile] [--trace trace.json] [--jsonl] [--npz] [--seed seed] <gfd file>")
+    exit(2)
 
 if __name__ == "__main__":
-    if len(argv) < 2:
+    args = argv[1:]
+    watching = caching = lazy = robust = False
+    seed = None
+    filename = None
+    formats = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--watch":
+            watching = True
+        elif arg == "--cache":
+            caching = True
+        elif arg == "--lazy":
+            lazy = True
+        elif arg == "--robust":
+            robust = True
+        elif arg.startswith("--") and arg[2:] in FORMATS:
+            formats.append(arg[2:])
+        elif arg == "--profile":
+            profiler.enable()
+        elif arg == "--trace" and args:
+            profiler.enable(args.pop(0))
+        elif arg == "--seed" and args and args[0].lstrip("-").isdigit():
+            seed = int(args.pop(0))
+        elif arg.startswith("--") or filename is not None:
+            usage()
+        else:
+            filename = arg
+    if filename is None:
         raise GFDException("need a .gfd file")
-    filename = argv[1]
-    figure = Figure()
-    figure.interpret(filename)
+    if watching:
+        watch(filename, seed, lazy, formats, robust)
+    else:
+        figure = Figure(seed, lazy, formats, robust)
+        figure.interpret(filename, ResultCache() if caching else None)
@@ -0,0 +1,65 @@
+from sys import argv, exit
+from concurrent.futures import ProcessPoolExecutor
+
+from main import Figure
+from compiler import load
+
+def instance_facts(program, seed):
+    """
+    properties of an instance of the compiled figure with the given seed, None if the instance can not be constructed
+    any error of an instance, e.g. a division by zero in a degenerate configuration, only makes it degenerate so the other instances still run
+    """
+    figure = Figure(seed)
+    try:
+        figure.run(program)
+        return figure.facts()
+    except Exception:
+        return None
+
+def verify(filename, runs=64, workers=None):
+    """
+    renders the gfd file into its asy and txt files, the unknown properties are checked on `runs` instances of the figure
+    every instance uses a different seed for the random construction functions (the seed lines of the file are ignored), the first one is the rendered figure
+    the file is compiled once and every instance runs the compiled program
+    only the properties that hold in every instance are included, the others are coincidences of the random choices
+    returns the number of instances that could not be constructed
+    """
+    program = load(filename)
+    figure = Figure(0)
+    figure.run(program)
+    verified = figure.facts()
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        seeds = range(1, runs)
+        for facts in executor.map(instance_facts, [program] * len(seeds), seeds, chunksize=max(1, len(seeds) // 32)):
+            if facts is None:
+                failed += 1
+                continue
+            for pname, keys in facts.items():
+                verified[pname] &= keys
+
+    with open(f"{filename[:-4]}.asy", "w+") as file:
+        figure.write_asy(file)
+
+    with open(f"{filename[:-4]}.txt", "w+") as file:
+        figure.write_txt(file, verified)
+    return failed
+
+def usage():
+    print("usage: python montecarlo.py [-n runs] [-j workers] <gfd file>")
+    exit(2)
+
+if __name__ == "__main__":
+    args = argv[1:]
+    options = {"-n": 64, "-j": None}
+    while len(args) > 1:
+        if args[0] not in options or not args[1].isdigit():
+            usage()
+        options[args[0]] = int(args[1])
+        args = args[2:]
+    if len(args) != 1:
+        usage()
+    failed = verify(args[0], options["-n"], options["-j"])
+    if failed:
+        print(f"{failed} of {options['-n']} instances could not be constructed")
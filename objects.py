@@ -1,30 +1,43 @@
-from math import atan, pi
+from math import atan, pi, sqrt
 
-EPSILON = 1e-5
+from context import current
+from exceptions import FigureException
 
 class Obj:
     """
     base class for the objects in the figure
 
     id: int
-        id of the object, starts from 0 and increases with every object created
+        id of the object, starts from 0 and increases with every object created in the figure context
     order: int
         the order that this object appears in the final asy, 0 for points, 1 for lines, 2 for circles
         together with id, they define the object order in the final asy
     name: str
         name/label of the object, starts with __ for objects that are not intended to be in the figure
         later replaced by the user defined name
+    index: int
+        position of the coordinates of the object in the columns of its kind in the figure context, -1 for lightweight objects
+        the columns hold a copy of the coordinates, the ones of the object are the ones that are read, see Columns
+
+    objects use __slots__ instead of a __dict__, since figures may have very many of them
     """
+    __slots__ = ("order", "id", "label", "index", "recipe_parent_depth_set", "parents", "recipe", "depth", "initialized")
 
-    count = 0
     def __init__(self, asy_order):
+        context = current()
         self.order = asy_order
-        self.id = Obj.count
-        Obj.count += 1
-        self.name = f"o_{{{str(self.id)}}}"
+        if context.light():
+            context.light_count -= 1
+            self.id = context.light_count
+        else:
+            self.id = context.count
+            context.count += 1
+        self.reset_name()
+        self.index = -1
+        context.touch(self)
 
         self.recipe_parent_depth_set = False
-        self.parents = []
+        self.parents = ()
         self.recipe = ""
         self.depth = 0
 
@@ -39,6 +52,18 @@ class Obj:
     def __hash__(self):
         return hash(self.id)
     
+    @property
+    def name(self):
+        # the default name is not stored, so that the objects that are never named do not keep a string
+        return f"o_{{{str(self.id)}}}" if self.label is None else self.label
+
+    @name.setter
+    def name(self, name):
+        self.label = name
+
+    def reset_name(self):
+        self.label = None
+
     def criteria(self):
         """criteria for sorting the objects, first type (Point, Line, Circle), then id"""
         return self.order, self.id
@@ -49,43 +74,53 @@ class Point(Obj):
 
     x, y: float
         x and y coordinates of the point
-    
-    points: list[Point]
-        points created so far, if the same point is created again just return the already existing one
+
+    if the same point is created again in the figure context, the already existing one is returned
+    points are keyed by (x, y) in the index of the context
     """
+    __slots__ = ("x", "y", "direction")
 
-    points = []
     def __new__(cls, x, y):
-        for point in cls.points:
-            if abs(x - point.x) < EPSILON and abs(y - point.y) < EPSILON:
-                return point
-        return super().__new__(cls)
+        context = current()
+        point = None if context.light() else context.points.find((x, y))
+        if point is not None:
+            return point
+        point = super().__new__(cls)
+        point.initialized = False
+        return point
 
     def __init__(self, x, y):
-        for point in Point.points:
-            if abs(x - point.x) < EPSILON and abs(y - point.y) < EPSILON:
-                self.recipe_parent_depth_set = True
-                return
+        if self.initialized:
+            # already existing point returned by __new__
+            self.recipe_parent_depth_set = True
+            current().touch(self)
+            return
         super().__init__(0)
         self.x = x
         self.y = y
-        Point.points.append(self)
+        self.initialized = True
+        if self.id >= 0:
+            current().register(self)
+
+    @property
+    def key(self):
+        return self.x, self.y
+
+    @property
+    def coordinates(self):
+        return self.x, self.y
     
     def __repr__(self):
         return f"Point {self.name} [{self.id}](depth {self.depth}) {self.description}"
     
-    def set_dir(self, properties, objects):
+    def set_dir(self, layout):
         """find the emptiest part around the point to put the label"""
         occupied_directions = []
-        lines = [pl[1] for pl in properties["point on line"] if self in pl if pl[1] in objects]
-        circles = [pc[1] for pc in properties["point on circle"] if self in pc if pc[1] in objects]
-        for line in lines:
+        for line in layout.lines.get(self, ()):
             u = atan(line.slope)
-            points = [pl[0] for pl in properties["point on line"] if line in pl if pl[0] in objects if pl[0] is not self]
-            if not points:
+            lm, rm = layout.extremes_without(line, self)
+            if lm is None:
                 continue
-            lm = min(points, key=lambda p: p.x)
-            rm = max(points, key=lambda p: p.x)
             if (self.x - lm.x) * (self.x - rm.x) > 0:
                 # not line, but ray, so include only one direction
                 if u > 0:
@@ -108,7 +143,7 @@ class Point(Obj):
                 # line, so include both directions
                 occupied_directions.append(u)
                 occupied_directions.append(u + pi)
-        for circle in circles:
+        for circle in layout.circles.get(self, ()):
             dx = self.x - circle.o.x
             dy = self.y - circle.o.y
             u = atan(dy / dx)
@@ -146,33 +181,54 @@ class Line(Obj):
     a, b, c: float
         coefficients of the line equation ax+by=c
 
-    lines: list[Line]
-        lines created so far, if the same line is created again just return the already existing one
+    if the same line is created again in the figure context, the already existing one is returned
+    lines are keyed by the normalized coefficients in the index of the context
     """
+    __slots__ = ("a", "b", "c", "lmrm", "lm", "rm", "lm_in_figure", "rm_in_figure", "lmrmf", "lmf", "rmf")
 
-    lines = []
     def __new__(cls, a, b, c):
-        for line in cls.lines:
-            ka = line.a / a
-            kb = line.b / b
-            kc = line.c / c
-            if abs(ka - kb) < EPSILON and abs(ka - kc) < EPSILON:
-                return line
-        return super().__new__(cls)
+        context = current()
+        line = None if context.light() else context.lines.find(cls.normalized(a, b, c))
+        if line is not None:
+            return line
+        line = super().__new__(cls)
+        line.initialized = False
+        return line
 
     def __init__(self, a, b, c):
-        for line in Line.lines:
-            ka = line.a / a
-            kb = line.b / b
-            kc = line.c / c
-            if abs(ka - kb) < EPSILON and abs(ka - kc) < EPSILON:
-                self.recipe_parent_depth_set = True
-                return
+        if self.initialized:
+            # already existing line returned by __new__
+            self.recipe_parent_depth_set = True
+            current().touch(self)
+            return
         super().__init__(1)
         self.a = a
         self.b = b
         self.c = c
-        Line.lines.append(self)
+        self.initialized = True
+        if self.id >= 0:
+            current().register(self)
+
+    @property
+    def key(self):
+        return Line.normalized(self.a, self.b, self.c)
+
+    @property
+    def coordinates(self):
+        return self.a, self.b, self.c
+
+    @staticmethod
+    def normalized(a, b, c):
+        """
+        coefficients scaled so that a^2+b^2=1 and the one of a and b with the larger absolute value is positive
+        the sign is not chosen by a alone, so that almost horizontal lines do not get two different keys for tiny values of a
+        """
+        k = sqrt(a * a + b * b)
+        if k == 0:
+            raise FigureException(f"{a}x+{b}y={c} is not a line, a and b are both 0")
+        if (a if abs(a) >= abs(b) else b) < 0:
+            k = -k
+        return a / k, b / k, c / k
     
     def __repr__(self):
         if not self.lmrmf:
@@ -186,25 +242,19 @@ class Line(Obj):
     def slope(self):
         return -self.a / self.b
     
-    def set_lm_rm(self, properties, objects):
+    def set_lm_rm(self, layout):
         """based on the properties, find the leftmost and rightmost points on the line, used for drawing in asy"""
-        points = [pl[0] for pl in properties["point on line"] if self in pl]
-        self.lmrm = False
-        if not points:
+        self.lmrm = self in layout.extremes
+        if not self.lmrm:
             return
-        self.lmrm = True
-        self.lm = min(points, key=lambda p: p.x)  # leftmost point on the line
-        self.rm = max(points, key=lambda p: p.x)  # rightmost point on the line
-        self.lm_in_figure = self.lm in objects
-        self.rm_in_figure = self.rm in objects
-        points_in_figure = [p for p in points if p in objects]
-        self.lmrmf = False
-        if len(points_in_figure) < 2:
+        self.lm, self.rm = layout.extremes[self]  # leftmost and rightmost points on the line
+        self.lm_in_figure = self.lm in layout.objects
+        self.rm_in_figure = self.rm in layout.objects
+        self.lmrmf = self in layout.figure_extremes
+        if not self.lmrmf:
             return
-        self.lmrmf = True
-        self.lmf = min(points_in_figure, key=lambda p: p.x)
-        self.rmf = max(points_in_figure, key=lambda p: p.x)
-    
+        self.lmf, self.rmf = layout.figure_extremes[self]
+
     def asy_definition(self) -> str:
         """asy line for defining this line"""
         if not self.lmrm:
@@ -228,27 +278,41 @@ class Circle(Obj):
         center of the circle
     r: float
         radius of the circle
-    
-    circles: list[Circle]
-        circles created so far, if the same circle is created again just return the already existing one
+
+    if the same circle is created again in the figure context, the already existing one is returned
+    circles are keyed by (ox, oy, r) in the index of the context
     """
+    __slots__ = ("o", "r")
 
-    circles = []
     def __new__(cls, o, r):
-        for circle in cls.circles:
-            if abs(circle.o.x - o.x) < EPSILON and abs(circle.o.y - o.y) < EPSILON and abs(circle.r - r) < EPSILON:
-                return circle
-        return super().__new__(cls)
+        context = current()
+        circle = None if context.light() else context.circles.find((o.x, o.y, r))
+        if circle is not None:
+            return circle
+        circle = super().__new__(cls)
+        circle.initialized = False
+        return circle
 
     def __init__(self, o, r):
-        for circle in Circle.circles:
-            if abs(circle.o.x - o.x) < EPSILON and abs(circle.o.y - o.y) < EPSILON and abs(circle.r - r) < EPSILON:
-                self.recipe_parent_depth_set = True
-                return
+        if self.initialized:
+            # already existing circle returned by __new__
+            self.recipe_parent_depth_set = True
+            current().touch(self)
+            return
         super().__init__(2)
         self.o = o
         self.r = r
-        Circle.circles.append(self)
+        self.initialized = True
+        if self.id >= 0:
+            current().register(self)
+
+    @property
+    def key(self):
+        return self.o.x, self.o.y, self.r
+
+    @property
+    def coordinates(self):
+        return self.o.x, self.o.y, self.r
 
     def __repr__(self):
         return f"Circle {self.name} [{self.id}](depth {self.depth}) {self.description}"
@@ -264,3 +328,55 @@ class Circle(Obj):
         else:
             return f"draw({self.name_wo_special});"
 
+class Layout:
+    """
+    incidences and extreme points of the objects in the figure, computed once from the properties
+    so that placing the labels and drawing the lines do not scan the properties again for every object
+
+    objects: set[Obj]
+        objects in the figure
+    lines: dict[Point, list[Line]]
+        lines in the figure through every point in the figure
+    circles: dict[Point, list[Circle]]
+        circles in the figure through every point in the figure
+    points: dict[Line, list[Point]]
+        points in the figure on every line in the figure
+    extremes: dict[Line, (Point, Point)]
+        leftmost and rightmost points on every line in the figure, including the points that are not in the figure
+    figure_extremes: dict[Line, (Point, Point)]
+        leftmost and rightmost points in the figure on every line in the figure with at least two of them
+    """
+    def __init__(self, properties, objects):
+        self.objects = set(objects)
+        self.lines = {}
+        self.circles = {}
+        self.points = {}
+        self.extremes = {}
+        self.figure_extremes = {}
+        for obj in self.objects:
+            if obj.order == 1:
+                points = properties.points_on_line(obj)
+                if not points:
+                    continue
+                self.extremes[obj] = (min(points, key=lambda p: p.x), max(points, key=lambda p: p.x))
+                points_in_figure = [p for p in points if p in self.objects]
+                self.points[obj] = points_in_figure
+                for p in points_in_figure:
+                    self.lines.setdefault(p, []).append(obj)
+                if len(points_in_figure) >= 2:
+                    self.figure_extremes[obj] = (min(points_in_figure, key=lambda p: p.x), max(points_in_figure, key=lambda p: p.x))
+            elif obj.order == 2:
+                for p in properties.points_on_circle(obj):
+                    if p in self.objects:
+                        self.circles.setdefault(p, []).append(obj)
+
+    def extremes_without(self, line, point) -> tuple:
+        """leftmost and rightmost points in the figure on the line other than the point, (None, None) if there are none"""
+        if line not in self.figure_extremes:
+            return None, None
+        lmf, rmf = self.figure_extremes[line]
+        if point is not lmf and point is not rmf:
+            return lmf, rmf
+        # only the extreme points need another pass, so it is at most two more passes for every line
+        points = [p for p in self.points[line] if p is not point]
+        return min(points, key=lambda p: p.x), max(points, key=lambda p: p.x)
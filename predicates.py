@@ -0,0 +1,160 @@
+from fractions import Fraction
+from math import tan
+
+from spatial import EPSILON
+
+# robust versions of the check functions, used instead of them in the robust mode of the figure context
+# every check function compares a float expression with EPSILON, which may give the wrong answer when the expression is very close to it
+# here the same comparison is written as the signs of polynomials of the coordinates, and a polynomial is
+#   1. evaluated with floats together with a bound of its rounding error, which decides almost every case as fast as floats
+#   2. evaluated exactly with fractions (every float is a fraction) only if it is closer to 0 than the error bound
+# so the result is always the one of the exact expression for the coordinates of the objects
+#
+# a polynomial is a function of (minus, e, t, *values) that computes it with e = EPSILON and t = tan(EPSILON)
+# with minus = -1, it is the value, with minus = 1 and the absolute values of the inputs, every subtraction becomes an addition
+# and it is an upper bound of the absolute values of every intermediate result, the rounding error is at most ERROR times it
+
+# bound of the rounding error of the float evaluation relative to the magnitude of a polynomial
+# it is at most about one unit in the last place for every operation, and the polynomials below have less than 32 of them
+ERROR = 64 * 2.0 ** -53
+
+def exact_tan(x, terms=12) -> Fraction:
+    """tan(x) with the taylor series of sin and cos, the error is far below the precision of floats for x = EPSILON"""
+    sin = cos = Fraction(0)
+    power = Fraction(1)
+    factorial = 1
+    for k in range(2 * terms):
+        if k:
+            power *= x
+            factorial *= k
+        term = power / factorial * (-1) ** (k // 2)
+        if k % 2:
+            sin += term
+        else:
+            cos += term
+    return sin / cos
+
+EXACT_EPSILON = Fraction(EPSILON)
+EXACT_TAN = exact_tan(EXACT_EPSILON)
+TAN = tan(EPSILON)
+
+def positive(polynomial, *values) -> bool:
+    """whether the polynomial of the values is positive, exactly"""
+    value = polynomial(-1, EPSILON, TAN, *values)
+    bound = ERROR * polynomial(1, EPSILON, TAN, *map(abs, values))
+    if value > bound:
+        return True
+    if value < -bound:
+        return False
+    return polynomial(-1, EXACT_EPSILON, EXACT_TAN, *map(Fraction, values)) > 0
+
+# polynomials
+
+def near_line(minus, e, t, x, y, a, b, c):
+    """e^2 (a^2 + b^2) - (ax + by - c)^2, positive if the point is closer than e to the line ax + by = c"""
+    l = a * x + b * y + minus * c
+    return e * e * (a * a + b * b) + minus * l * l
+
+def near_segment_line(minus, e, t, ax, ay, bx, by, cx, cy):
+    """positive if a is closer than e to the line bc, distance_ppp"""
+    cross = (cy + minus * by) * ax + (bx + minus * cx) * ay + minus * (bx * cy + minus * by * cx)
+    return e * e * ((bx + minus * cx) ** 2 + (by + minus * cy) ** 2) + minus * cross * cross
+
+def inside(minus, e, t, ax, ay, ox, oy, k, sign_r, r, sign_e):
+    """(k +- r +- e)^2 - |ao|^2, positive if a is inside the circle with center o and that radius"""
+    radius = k + (minus * r if sign_r < 0 else r) + (minus * e if sign_e < 0 else e)
+    return radius * radius + minus * ((ax + minus * ox) ** 2 + (ay + minus * oy) ** 2)
+
+def radius_below(minus, e, t, k, sign_r, r, sign_e):
+    """positive if k +- r +- e < 0"""
+    return minus * (k + (minus * r if sign_r < 0 else r) + (minus * e if sign_e < 0 else e))
+
+def line_within(minus, e, t, x, y, a, b, c, r, sign_e):
+    """(r +- e)^2 (a^2 + b^2) - (ax + by - c)^2, positive if the point is closer than r +- e to the line"""
+    l = a * x + b * y + minus * c
+    radius = r + (minus * e if sign_e < 0 else e)
+    return radius * radius * (a * a + b * b) + minus * l * l
+
+def determinant_below(minus, e, t, ua, ub, uc, va, vb, vc, wa, wb, wc):
+    """e - |determinant|, positive if the lines are concurrent, is_concurrent"""
+    d = ua * vc * wb + ub * va * wc + uc * vb * wa + minus * (ua * vb * wc + ub * vc * wa + uc * va * wb)
+    return e + minus * abs(d)
+
+def parallel(minus, e, t, ua, ub, va, vb):
+    """t |dot| - |cross|, positive if the angle between the lines is less than e"""
+    return t * abs(ua * va + ub * vb) + minus * abs(va * ub + minus * ua * vb)
+
+def perpendicular(minus, e, t, ua, ub, va, vb):
+    """t |cross| - |dot|, positive if the angle between the lines is more than pi / 2 - e"""
+    return t * abs(va * ub + minus * ua * vb) + minus * abs(ua * va + ub * vb)
+
+def angle_terms(minus, ax, ay, bx, by, cx, cy):
+    """cross and dot products of the lines ab and ac, angle_ppp(a, b, c) is |atan(cross / dot)|"""
+    ua, ub = by + minus * ay, ax + minus * bx
+    va, vb = cy + minus * ay, ax + minus * cx
+    return va * ub + minus * ua * vb, ua * va + ub * vb
+
+def equal_angles(minus, e, t, ax, ay, bx, by, cx, cy, dx, dy):
+    """
+    positive if angle_ppp(a, b, c) and angle_ppp(d, b, c) differ by less than e
+    for the tangents p and q of the angles, |p - q| < tan(e) (1 + pq), multiplied by the dot products
+    """
+    c1, x1 = angle_terms(minus, ax, ay, bx, by, cx, cy)
+    c2, x2 = angle_terms(minus, dx, dy, bx, by, cx, cy)
+    c1, x1, c2, x2 = abs(c1), abs(x1), abs(c2), abs(x2)
+    return t * (x1 * x2 + c1 * c2) + minus * abs(c1 * x2 + minus * c2 * x1)
+
+# robust check functions, same names and parameters as the ones in functions.py
+
+def is_collinear(a, b, c) -> bool:
+    return positive(near_segment_line, a.x, a.y, b.x, b.y, c.x, c.y)
+
+def is_concyclic(a, b, c, d) -> bool:
+    return positive(equal_angles, a.x, a.y, b.x, b.y, c.x, c.y, d.x, d.y) and positive(equal_angles, b.x, b.y, a.x, a.y, c.x, c.y, d.x, d.y)
+
+def is_concurrent(u, v, w) -> bool:
+    return positive(determinant_below, u.a, u.b, u.c, v.a, v.b, v.c, w.a, w.b, w.c)
+
+def is_parallel(u, v) -> bool:
+    return positive(parallel, u.a, u.b, v.a, v.b)
+
+def is_perpendicular(u, v) -> bool:
+    return positive(perpendicular, u.a, u.b, v.a, v.b)
+
+def within_circle_distance(a, o, k, r, sign_r) -> bool:
+    """
+    whether the distance between a and o is closer than e to k +- r, i.e. ||ao| - (k +- r)| < e
+    |ao| < k +- r + e if it is not negative, and |ao| > k +- r - e unless it is negative
+    """
+    return (not positive(radius_below, k, sign_r, r, 1)
+            and positive(inside, a.x, a.y, o.x, o.y, k, sign_r, r, 1)
+            and (positive(radius_below, k, sign_r, r, -1) or not positive(inside, a.x, a.y, o.x, o.y, k, sign_r, r, -1)))
+
+def is_tangent(s, t) -> bool:
+    """||t.r - |st|| - s.r| < e, so |st| is closer than e to t.r + s.r or to t.r - s.r"""
+    return within_circle_distance(s.o, t.o, t.r, s.r, 1) or within_circle_distance(s.o, t.o, t.r, s.r, -1)
+
+def is_pl(a, u) -> bool:
+    return positive(near_line, a.x, a.y, u.a, u.b, u.c)
+
+def is_pc(a, s) -> bool:
+    return within_circle_distance(a, s.o, s.r, 0.0, 1)
+
+def is_lc(u, s) -> bool:
+    """|distance_pl(s.o, u) - s.r| < e"""
+    o = s.o
+    return (positive(line_within, o.x, o.y, u.a, u.b, u.c, s.r, 1)
+            and (positive(radius_below, s.r, 1, 0.0, -1) or not positive(line_within, o.x, o.y, u.a, u.b, u.c, s.r, -1)))
+
+# dict[str, function], check function name -> robust version
+robust_functions = {
+    "is_collinear": is_collinear,
+    "is_concyclic": is_concyclic,
+    "is_concurrent": is_concurrent,
+    "is_parallel": is_parallel,
+    "is_perpendicular": is_perpendicular,
+    "is_tangent": is_tangent,
+    "is_pl": is_pl,
+    "is_pc": is_pc,
+    "is_lc": is_lc,
+}
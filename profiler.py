@@ -0,0 +1,177 @@
+from os import environ, path, getpid
+from sys import modules, stderr
+from time import perf_counter
+from functools import wraps
+from json import dump
+
+from functions import construction_functions, check_functions
+from deduction import rules, Deduction
+from objects import Point, Line
+from spatial import SpatialIndex
+import functions
+
+# set to a json file name to write a chrome trace (chrome://tracing, perfetto) of every interpreted figure, or to anything else to print a summary table
+ENVIRONMENT_VARIABLE = "GFD_PROFILE"
+
+DIRECTORY = path.dirname(path.abspath(__file__))
+
+# the profiler that the instrumented functions report to, None if profiling is not enabled
+active = None
+
+class Profiler:
+    """
+    counts the calls and accumulates the time of the construction functions, check functions, deduction rules and phases
+    the functions are instrumented by replacing them with timed wrappers when the profiler is enabled
+    nothing is replaced while it is not enabled, so it costs nothing then
+
+    trace: str
+        json file that the chrome trace is written to, the summary table is printed if it is None
+    stats: dict[(str, str), list]
+        calls, total time and self time (total time without the instrumented calls it makes) by category and name
+    scans: list[int]
+        number of dedup lookups, of objects compared in them, the most compared in a single one and of lookups that found an object
+    events: list[(str, str, float, float)]
+        category, name, start time and duration of every instrumented call, only if trace is given
+    patches: list[(object, str, object)]
+        replaced attributes, owner, name and the original value
+    """
+    def __init__(self, trace=None):
+        self.trace = trace
+        self.stats = {}
+        self.scans = [0, 0, 0, 0]
+        self.events = [] if trace is not None else None
+        self.stack = []
+        self.patches = []
+        self.origin = perf_counter()
+
+    def timed(self, category, name, func):
+        """wrapper of func that records its calls"""
+        stats = self.stats.setdefault((category, name), [0, 0.0, 0.0])
+        stack = self.stack
+        events = self.events
+        @wraps(func)
+        def inner(*args, **kwargs):
+            stack.append(0.0)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += elapsed - children
+                if events is not None:
+                    events.append((category, name, start, elapsed))
+        return inner
+
+    def counted_find(self, find):
+        """wrapper of SpatialIndex.find that records how many objects are compared"""
+        scans = self.scans
+        @wraps(find)
+        def inner(index, key):
+            scanned = sum(len(index.cells.get(cell, ())) for cell in index.neighbour_cells(key))
+            result = find(index, key)
+            scans[0] += 1
+            scans[1] += scanned
+            scans[2] = max(scans[2], scanned)
+            scans[3] += result is not None
+            return result
+        return inner
+
+    def patch(self, owner, name, value):
+        self.patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    def patch_everywhere(self, original, value):
+        """replaces the function in every module of this package that imported it"""
+        for module in list(modules.values()):
+            filename = getattr(module, "__file__", None)
+            if filename is None or path.dirname(path.abspath(filename)) != DIRECTORY:
+                continue
+            for name, attribute in list(vars(module).items()):
+                if attribute is original:
+                    self.patch(module, name, value)
+
+    def enable(self):
+        for category, registry in (("construction", construction_functions), ("check", check_functions), ("rule", rules)):
+            for name, function in registry.items():
+                original = function.function
+                wrapper = self.timed(category, name, original)
+                self.patch(function, "function", wrapper)
+                # so that the calls between the functions are instrumented too
+                self.patch_everywhere(original, wrapper)
+
+        self.patch_everywhere(functions.check_everything, self.timed("phase", "check_everything", functions.check_everything))
+        self.patch_everywhere(functions.check_figure, self.timed("phase", "check_figure", functions.check_figure))
+        self.patch(Deduction, "run", self.timed("phase", "check_trivial", Deduction.run))
+        self.patch(Point, "set_dir", self.timed("phase", "set_dir", Point.set_dir))
+        self.patch(Line, "set_lm_rm", self.timed("phase", "set_lm_rm", Line.set_lm_rm))
+        self.patch(SpatialIndex, "find", self.counted_find(self.timed("phase", "dedup", SpatialIndex.find)))
+
+    def disable(self):
+        for owner, name, original in reversed(self.patches):
+            setattr(owner, name, original)
+        self.patches.clear()
+
+    def reset(self):
+        """forgets the recorded calls, the same lists are kept since the wrappers refer to them"""
+        for stats in self.stats.values():
+            stats[:] = [0, 0.0, 0.0]
+        self.scans[:] = [0, 0, 0, 0]
+        if self.events is not None:
+            self.events.clear()
+        self.origin = perf_counter()
+
+    def table(self) -> str:
+        s = f"{'category':14}{'name':36}{'calls':>9}{'total ms':>12}{'self ms':>12}{'mean us':>10}\n"
+        for (category, name), (calls, total, own) in sorted(self.stats.items(), key=lambda x: -x[1][2]):
+            if calls:
+                s += f"{category:14}{name:36}{calls:9}{total * 1000:12.3f}{own * 1000:12.3f}{total / calls * 1e6:10.1f}\n"
+        finds, scanned, longest, hits = self.scans
+        if finds:
+            s += f"\ndedup: {finds} lookups, {hits} found an existing object, {scanned / finds:.2f} objects compared on average, {longest} at most\n"
+        return s
+
+    def chrome_trace(self) -> dict:
+        pid = getpid()
+        events = [{
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": elapsed * 1e6,
+            "pid": pid,
+            "tid": 0,
+        } for category, name, start, elapsed in self.events]
+        finds, scanned, longest, hits = self.scans
+        events.append({"name": "dedup", "ph": "C", "ts": 0, "pid": pid, "args": {"lookups": finds, "compared": scanned, "longest": longest, "found": hits}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def report(self):
+        """prints the summary table or writes the chrome trace of the calls since the last report"""
+        if self.trace is None:
+            print(self.table(), file=stderr)
+        else:
+            with open(self.trace, "w") as file:
+                dump(self.chrome_trace(), file)
+        self.reset()
+
+def enable(trace=None) -> Profiler:
+    """instruments the functions, the calls are reported at the end of every Figure.interpret"""
+    global active
+    if active is None:
+        active = Profiler(trace)
+        active.enable()
+    return active
+
+def disable():
+    global active
+    if active is not None:
+        active.disable()
+        active = None
+
+if environ.get(ENVIRONMENT_VARIABLE):
+    enable(environ[ENVIRONMENT_VARIABLE] if environ[ENVIRONMENT_VARIABLE].endswith(".json") else None)
@@ -0,0 +1,380 @@
+from itertools import combinations
+from math import comb
+from array import array
+
+def criteria(obj):
+    return obj.criteria()
+
+class EquivalenceClasses:
+    """
+    stores a property of `size` objects like collinearity as maximal classes instead of every tuple
+    a class is a set of objects every `size` of which satisfy the property, e.g. the points on a line
+    two classes that share `size - 1` objects have the same carrier (line, circle or concurrency point) so they are merged
+    tuples are only expanded when iterated, everything else is linear in the number of incidences
+
+    size: int
+        number of objects in a tuple of the property, 3 for collinear points, 4 for concyclic points
+    parent: dict[int, int]
+        union-find parent of every class id
+    members: dict[int, set[Obj]]
+        objects in the class for every root class id
+    classes: dict[Obj, set[int]]
+        ids of the classes that the object is in, they may not be root ids
+    """
+    def __init__(self, size):
+        self.size = size
+        self.parent = {}
+        self.members = {}
+        self.classes = {}
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def roots(self, obj):
+        """root ids of the classes that obj is in"""
+        roots = {self.find(i) for i in self.classes.get(obj, ())}
+        if obj in self.classes:
+            self.classes[obj] = roots
+        return roots
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return i
+        if len(self.members[i]) < len(self.members[j]):
+            i, j = j, i
+        self.parent[j] = i
+        for obj in self.members[j]:
+            self.classes[obj].add(i)
+        self.members[i] |= self.members.pop(j)
+        return i
+
+    def common_class(self, *objs) -> set:
+        """objects in the class that contains all of objs, empty if there is no such class"""
+        roots = set.intersection(*(self.roots(obj) for obj in objs))
+        return self.members[next(iter(roots))] if roots else set()
+
+    def add(self, objs) -> bool:
+        """adds a class of at least `size` objects satisfying the property, returns whether anything new is learned"""
+        objs = set(objs)
+        if len(objs) < self.size or self.common_class(*objs):
+            return False
+        i = len(self.parent)
+        self.parent[i] = i
+        self.members[i] = set()
+        pending = objs
+        while pending:
+            for obj in pending:
+                self.classes.setdefault(obj, set()).add(i)
+            self.members[i] |= pending
+            # classes that share at least size - 1 objects with the current class have the same carrier
+            shared = {}
+            for obj in self.members[i]:
+                for root in self.roots(obj):
+                    if root != i:
+                        shared[root] = shared.get(root, 0) + 1
+            before = set(self.members[i])
+            for root, count in shared.items():
+                if count >= self.size - 1:
+                    i = self.union(i, root)
+            pending = self.members[i] - before
+        return True
+
+    def clear(self):
+        self.parent.clear()
+        self.members.clear()
+        self.classes.clear()
+
+    def update(self, tuples):
+        for objs in tuples:
+            self.add(objs)
+
+    def __contains__(self, objs) -> bool:
+        return len(objs) == self.size and bool(self.common_class(*objs))
+
+    def __iter__(self):
+        return self.tuples()
+
+    def __len__(self):
+        return sum(comb(len(members), self.size) for members in self.members.values())
+
+    def all_classes(self):
+        """every class, sorted by criteria"""
+        return [sorted(members, key=criteria) for members in self.members.values()]
+
+    def tuples(self, objects=None):
+        """every tuple of the property, only the ones whose objects are all in objects if it is given"""
+        for members in self.all_classes():
+            if objects is not None:
+                members = [obj for obj in members if obj in objects]
+            yield from combinations(members, self.size)
+
+    def copy(self):
+        other = EquivalenceClasses(self.size)
+        other.parent = dict(self.parent)
+        other.members = {i: set(members) for i, members in self.members.items()}
+        other.classes = {obj: set(ids) for obj, ids in self.classes.items()}
+        return other
+
+class Incidences:
+    """
+    set of pairs of objects that also keeps the objects paired with each object
+    the pairs are only changed through the methods below, so the adjacency is always up to date
+
+    pairs: set[(Obj, Obj)]
+        the pairs
+    adjacent: dict[Obj, set[Obj]]
+        objects that are paired with the object, e.g. the points on a line and the lines through a point
+    """
+    def __init__(self, pairs=()):
+        self.pairs = set()
+        self.adjacent = {}
+        self.update(pairs)
+
+    def __contains__(self, pair) -> bool:
+        return pair in self.pairs
+
+    def __iter__(self):
+        return iter(self.pairs)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def add(self, pair) -> bool:
+        """adds the pair, returns whether it is new"""
+        if pair in self.pairs:
+            return False
+        self.pairs.add(pair)
+        x, y = pair
+        self.adjacent.setdefault(x, set()).add(y)
+        self.adjacent.setdefault(y, set()).add(x)
+        return True
+
+    def update(self, pairs):
+        for pair in pairs:
+            self.add(pair)
+
+    def discard(self, pair):
+        if pair not in self.pairs:
+            return
+        self.pairs.discard(pair)
+        x, y = pair
+        self.adjacent[x].discard(y)
+        self.adjacent[y].discard(x)
+
+    def remove(self, pair):
+        if pair not in self.pairs:
+            raise KeyError(pair)
+        self.discard(pair)
+
+    def clear(self):
+        self.pairs.clear()
+        self.adjacent.clear()
+
+    def copy(self):
+        return Incidences(self.pairs)
+
+    def neighbours(self, obj) -> set:
+        return self.adjacent.get(obj, EMPTY)
+
+EMPTY = frozenset()
+
+# rule of the facts that are in the properties without a record of how they are found
+UNRECORDED = "unrecorded"
+# rule of a tuple of an equivalence class that is not added itself, derived from the facts that formed its class
+CLASS = "class"
+
+class Provenance:
+    """
+    how every fact in the properties is found, a fact is a property name and a tuple of objects sorted by criteria
+    facts found by a check function have the name of the construction function whose objects are checked as their rule, or "check"
+    facts derived by the deduction have the name of the rule and the ids of the facts it is derived from as premises
+    the records are kept in parallel arrays indexed by fact id, premises of every fact are a slice of a single array
+    premises are recorded before the facts derived from them, so their ids are always smaller
+
+    facts: list[(str, tuple[Obj])]
+        property name and objects of every fact
+    ids: dict[(str, tuple[Obj]), int]
+        id of every fact
+    rules: array[int]
+        index of the rule of every fact in rule_names
+    offsets: array[int]
+        premises of fact i are premises[offsets[i]:offsets[i + 1]]
+    premises: array[int]
+        ids of the premises of every fact, one after another
+    classes: set[str]
+        names of the properties stored as EquivalenceClasses
+    members: dict[(str, Obj), list[int]]
+        ids of the facts of an equivalence class property that the object is in
+    """
+    def __init__(self, classes=()):
+        self.facts = []
+        self.ids = {}
+        self.rule_names = []
+        self.rule_ids = {}
+        self.rules = array("i")
+        self.offsets = array("i", [0])
+        self.premises = array("i")
+        self.classes = set(classes)
+        self.members = {}
+
+    def __len__(self):
+        return len(self.facts)
+
+    def rule_id(self, rule) -> int:
+        if rule not in self.rule_ids:
+            self.rule_ids[rule] = len(self.rule_names)
+            self.rule_names.append(rule)
+        return self.rule_ids[rule]
+
+    def add(self, name, objs, rule, premise_ids=()) -> int:
+        """records the fact with already resolved premise ids, returns its id"""
+        i = len(self.facts)
+        self.facts.append((name, objs))
+        self.ids[(name, objs)] = i
+        self.rules.append(self.rule_id(rule))
+        self.premises.extend(premise_ids)
+        self.offsets.append(len(self.premises))
+        if name in self.classes:
+            for obj in objs:
+                self.members.setdefault((name, obj), []).append(i)
+        return i
+
+    def record(self, name, objs, rule, premises, properties) -> int:
+        """
+        records a new fact derived by the rule from the premises, which are (name, objs) of facts in properties
+        a rule may give the same premise more than once, e.g. the same incidence for two corners, it is recorded once
+        """
+        premise_ids = dict.fromkeys(self.fact_id(premise_name, premise_objs, properties) for premise_name, premise_objs in premises)
+        return self.add(name, tuple(sorted(objs, key=criteria)), rule, premise_ids)
+
+    def fact_id(self, name, objs, properties) -> int:
+        """
+        id of the fact, the objects in any order
+        a tuple of an equivalence class that is not recorded itself is recorded with the facts that formed its class as premises
+        """
+        objs = tuple(sorted(set(objs), key=criteria)) if name in self.classes else tuple(sorted(objs, key=criteria))
+        i = self.ids.get((name, objs))
+        if i is not None:
+            return i
+        if name not in self.classes:
+            return self.add(name, objs, UNRECORDED)
+        members = properties[name].common_class(*objs)
+        class_rule = self.rule_ids.get(CLASS)
+        support = set()
+        for obj in members:
+            for j in self.members.get((name, obj), ()):
+                if self.rules[j] != class_rule and all(other in members for other in self.facts[j][1]):
+                    support.add(j)
+        return self.add(name, objs, CLASS if support else UNRECORDED, sorted(support))
+
+    def premise_ids(self, i) -> array:
+        return self.premises[self.offsets[i]:self.offsets[i + 1]]
+
+    def rule(self, i) -> str:
+        return self.rule_names[self.rules[i]]
+
+    def derivation(self, name, objs, properties) -> list[tuple]:
+        """
+        derivation DAG of the fact, read from the records without deriving anything again
+        the fact and every fact it is derived from, directly or not, as (id, name, objs, rule, premise ids)
+        sorted by id, so every fact comes after its premises and the fact itself is the last one
+        """
+        seen = set()
+        pending = [self.fact_id(name, objs, properties)]
+        while pending:
+            i = pending.pop()
+            if i not in seen:
+                seen.add(i)
+                pending.extend(self.premise_ids(i))
+        return [(i, *self.facts[i], self.rule(i), list(self.premise_ids(i))) for i in sorted(seen)]
+
+    def copy(self):
+        other = Provenance(self.classes)
+        other.facts = list(self.facts)
+        other.ids = dict(self.ids)
+        other.rule_names = list(self.rule_names)
+        other.rule_ids = dict(self.rule_ids)
+        other.rules = array("i", self.rules)
+        other.offsets = array("i", self.offsets)
+        other.premises = array("i", self.premises)
+        other.members = {key: list(ids) for key, ids in self.members.items()}
+        return other
+
+class PropertyStore(dict):
+    """
+    the properties, mapping from property names to the sets of tuples satisfying them
+    pair properties are stored as Incidences and collinear, concyclic and concurrent as EquivalenceClasses
+    so the objects related to an object can be looked up directly instead of scanning a whole set
+
+    provenance: Provenance
+        how every fact is found
+    """
+    def __init__(self):
+        super().__init__({
+            "point on line": Incidences(),
+            "point on circle": Incidences(),
+            "line tangent to circle": Incidences(),
+            "line perpendicular to line": Incidences(),
+            "line parallel to line": Incidences(),
+            "circle tangent to circle": Incidences(),
+            "collinear points": EquivalenceClasses(3),
+            "concyclic points": EquivalenceClasses(4),
+            "concurrent lines": EquivalenceClasses(3),
+        })
+        self.provenance = Provenance(name for name, prop in self.items() if isinstance(prop, EquivalenceClasses))
+
+    def add_fact(self, name, objs, rule) -> bool:
+        """adds a tuple found by a check function to the property, it is recorded with the rule if it is new"""
+        if not self[name].add(objs):
+            return False
+        self.provenance.record(name, objs, rule, (), self)
+        return True
+
+    def derivation(self, name, objs) -> list[tuple]:
+        """derivation DAG of a fact, see Provenance.derivation"""
+        return self.provenance.derivation(name, objs, self)
+
+    def points_on_line(self, u) -> set:
+        return self["point on line"].neighbours(u)
+
+    def lines_through_point(self, a) -> set:
+        return self["point on line"].neighbours(a)
+
+    def points_on_circle(self, s) -> set:
+        return self["point on circle"].neighbours(s)
+
+    def circles_through_point(self, a) -> set:
+        return self["point on circle"].neighbours(a)
+
+    def parallel(self, u) -> set:
+        return self["line parallel to line"].neighbours(u)
+
+    def perpendicular(self, u) -> set:
+        return self["line perpendicular to line"].neighbours(u)
+
+    def tangent_circles(self, x) -> set:
+        """circles tangent to the line or circle x"""
+        if x.order == 1:
+            return self["line tangent to circle"].neighbours(x)
+        return self["circle tangent to circle"].neighbours(x)
+
+    def tangent_lines(self, s) -> set:
+        return self["line tangent to circle"].neighbours(s)
+
+    def clear(self):
+        for prop in self.values():
+            prop.clear()
+        self.provenance = Provenance(self.provenance.classes)
+
+    def copy(self):
+        other = PropertyStore()
+        for name, prop in self.items():
+            other[name] = prop.copy()
+        other.provenance = self.provenance.copy()
+        return other
@@ -0,0 +1,108 @@
+from sys import argv, exit
+from os import path, remove
+from json import dumps
+from urllib.parse import urlparse, parse_qs
+from socketserver import ThreadingMixIn, UnixStreamServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor
+
+from main import Figure
+from exceptions import GFDException
+
+def render(source, seed=None) -> dict:
+    """
+    renders gfd source into its asy and txt, every request uses a new figure so nothing is shared between requests
+    runs in a worker process that has the construction and check functions loaded already
+    """
+    figure = Figure(seed)
+    try:
+        figure.interpret_source(source)
+        return {"asy": figure.asy(), "txt": figure.txt()}
+    except GFDException as e:
+        return {"error": e.message, "file": e.input_file, "line": e.line_count}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """
+    POST gfd source as the request body, the response is a json object
+    with asy and txt on success, with error (and file and line if it is in a gfd line) otherwise
+    the seed of the random construction functions can be given in the query, e.g. /?seed=3
+    """
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        source = self.rfile.read(length).decode()
+        seed = parse_qs(urlparse(self.path).query).get("seed", [None])[0]
+        if seed is not None and not seed.lstrip("-").isdigit():
+            seed = None
+        result = self.server.executor.submit(render, source, None if seed is None else int(seed)).result()
+        body = dumps(result).encode()
+        self.send_response(400 if "error" in result else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # health check
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """http over a unix socket"""
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects (host, port)
+        return request, ("local", 0)
+
+def serve(address, workers=None):
+    """
+    serves render requests until interrupted
+    address is either a (host, port) pair for tcp or a path for a unix socket
+    """
+    if isinstance(address, str):
+        if path.exists(address):
+            remove(address)
+        server = ThreadingUnixHTTPServer(address, RenderHandler)
+    else:
+        server = ThreadingHTTPServer(address, RenderHandler)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # start every worker before the first request, the executor starts one process per task until it has as many as it can run
+        list(executor.map(render, [""] * (workers or executor._max_workers)))
+        server.executor = executor
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+def usage():
+    print("usage: python server.py [-j workers] [--port port | --unix socket_path]")
+    exit(2)
+
+if __name__ == "__main__":
+    args = argv[1:]
+    workers = None
+    address = ("127.0.0.1", 8035)
+    while args:
+        if len(args) < 2:
+            usage()
+        option, value = args[0], args[1]
+        args = args[2:]
+        if option == "-j" and value.isdigit():
+            workers = int(value)
+        elif option == "--port" and value.isdigit():
+            address = ("127.0.0.1", int(value))
+        elif option == "--unix":
+            address = value
+        else:
+            usage()
+    print(f"serving on {address if isinstance(address, str) else 'http://%s:%d' % address}")
+    serve(address, workers)
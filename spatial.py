@@ -0,0 +1,53 @@
+from itertools import product
+from math import floor
+
+EPSILON = 1e-5
+
+class SpatialIndex:
+    """
+    grid bucketed index used for finding the already existing object that is EPSILON-close to a new one
+
+    objects are keyed by a tuple of coordinates, (x, y) for points, normalized (a, b, c) for lines and (ox, oy, r) for circles
+    every coordinate is quantized into cells of size 2 * EPSILON, so a key that is closer than EPSILON to another one
+    in every coordinate is either in the same cell or in the neighbouring cell on the closer side, for each coordinate
+
+    cells: dict[tuple[int], list[(tuple[float], Obj)]]
+        mapping from quantized keys to the objects in that cell together with their keys
+    """
+    def __init__(self, cell_size=2 * EPSILON):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell(self, key):
+        return tuple(floor(k / self.cell_size) for k in key)
+
+    def neighbour_cells(self, key):
+        """the cells that may contain a key that is closer than half of the cell size to the given key"""
+        cells = []
+        for k in key:
+            q = k / self.cell_size
+            c = floor(q)
+            cells.append((c, c - 1) if q - c < 0.5 else (c, c + 1))
+        return product(*cells)
+
+    def find(self, key):
+        """the object whose key is EPSILON-close to the given key in every coordinate, None if there is no such object"""
+        for cell in self.neighbour_cells(key):
+            for other_key, obj in self.cells.get(cell, ()):
+                if all(abs(k - ok) < EPSILON for k, ok in zip(key, other_key)):
+                    return obj
+        return None
+
+    def add(self, key, obj):
+        self.cells.setdefault(self.cell(key), []).append((key, obj))
+
+class LineIndex(SpatialIndex):
+    """
+    spatial index of the lines, keyed by their normalized coefficients
+    the negated key is looked up too, since the sign of the lines with |a| and |b| almost equal may be chosen differently
+    """
+    def find(self, key):
+        obj = super().find(key)
+        if obj is None:
+            obj = super().find(tuple(-k for k in key))
+        return obj
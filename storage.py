@@ -0,0 +1,36 @@
+from array import array
+
+class Columns:
+    """
+    struct of arrays storage of the coordinates of one kind of object, every coordinate is a typed array of doubles
+    objects keep their position in the arrays, so the coordinates of many objects can be used at once without touching the objects
+
+    the objects keep their own coordinates too, so every coordinate is stored twice
+    the copy here costs 8 bytes per coordinate and 8 bytes per object in objects, under 1% of the memory of a figure
+    the objects do not read their coordinates from here, since every check and construction function reads them
+    and an array lookup through a property is about 10 times slower than a slot
+
+    names: tuple[str]
+        names of the coordinates, (x, y) for points, (a, b, c) for lines, (ox, oy, r) for circles
+    columns: tuple[array]
+        one array for every coordinate
+    objects: list[Obj]
+        object at every position
+    """
+    def __init__(self, *names):
+        self.names = names
+        self.columns = tuple(array("d") for _ in names)
+        self.objects = []
+
+    def append(self, obj, values) -> int:
+        """adds the coordinates of the object, returns its position"""
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.objects.append(obj)
+        return len(self.objects) - 1
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __getitem__(self, name) -> array:
+        return self.columns[self.names.index(name)]
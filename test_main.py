@@ -0,0 +1,31 @@
+from main import Figure
+
+SOURCE = """A B C = triangle
+D E F = B C midpoint C A midpoint A B midpoint
+u = A D line
+v = B E line
+w = C F line
+G = u v intersection_ll
+H = u w intersection_ll
+"""
+
+def known_counts(figure):
+    return {pname: len(list(tuples)) for pname, tuples in figure.known_tuples().items()}
+
+def test_update_drops_facts_of_removed_lines(tmp_path):
+    filename = str(tmp_path / "figure.gfd")
+    with open(filename, "w") as file:
+        file.write(SOURCE)
+    figure = Figure(1)
+    figure.interpret(filename)
+    assert list(figure.known_tuples()["concurrent lines"])
+
+    # the medians are known to be concurrent only through G and H
+    with open(filename, "w") as file:
+        file.write("".join(SOURCE.splitlines(True)[:5]))
+    figure.update(filename)
+    assert not list(figure.known_tuples()["concurrent lines"])
+
+    expected = Figure(1)
+    expected.interpret(filename)
+    assert known_counts(figure) == known_counts(expected)
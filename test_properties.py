@@ -0,0 +1,15 @@
+from os import path
+
+from main import Figure
+from compiler import Compiler
+
+def test_derivation_has_no_repeated_steps():
+    figure = Figure(1)
+    figure.run(Compiler().compile(path.join(path.dirname(__file__), "examples", "imo2012-p1", "figure.gfd")))
+    figure.known_properties()
+    derivation = figure.derivation("concyclic points", [figure.objects[name] for name in "AJKL"])
+    assert derivation is not None
+    ids = [i for i, name, objs, rule, premise_ids in derivation]
+    assert len(ids) == len(set(ids))
+    for i, name, objs, rule, premise_ids in derivation:
+        assert len(premise_ids) == len(set(premise_ids))
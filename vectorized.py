@@ -0,0 +1,196 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from spatial import EPSILON
+from context import current
+
+# candidates for concyclic points are found with a coarser tolerance and then confirmed with the formula of is_concyclic
+PRUNE = 1e-3
+
+def available() -> bool:
+    """whether numpy is installed, batch evaluation is not possible without it"""
+    return np is not None
+
+class Batch:
+    """
+    points, lines and circles packed into contiguous numpy arrays, sorted by criteria like the property tuples
+
+    points: list[Point], p: array (n, 2)
+        x, y of the points
+    lines: list[Line], l: array (m, 3)
+        a, b, c of the lines
+    circles: list[Circle], c: array (k, 3)
+        ox, oy, r of the circles
+
+    the coordinates are taken from the columns of the figure context, by the indexes of the objects
+    """
+    def __init__(self, objects):
+        objects = sorted(set(objects), key=lambda obj: obj.criteria())
+        columns = current().columns
+        self.points = [obj for obj in objects if obj.order == 0]
+        self.lines = [obj for obj in objects if obj.order == 1]
+        self.circles = [obj for obj in objects if obj.order == 2]
+        self.p = gather(columns[0], self.points)
+        self.l = gather(columns[1], self.lines)
+        self.c = gather(columns[2], self.circles)
+
+def gather(columns, objects):
+    """array of the coordinates of the objects, one row per object"""
+    indexes = np.array([obj.index for obj in objects], dtype=int)
+    if len(indexes) and (indexes.min() < 0 or columns.objects[indexes[0]] is not objects[0]):
+        # lightweight objects or objects of another context
+        return np.array([obj.coordinates for obj in objects], dtype=float).reshape(-1, len(columns.names))
+    return np.stack([np.frombuffer(column, dtype=float)[indexes] for column in columns.columns], axis=1).reshape(-1, len(columns.names))
+
+def save_coordinates(filename, objects):
+    """
+    saves the objects into a npz file, so that the coordinates of many figures can be loaded without parsing
+    for every kind (point, line, circle), {kind}_ids and {kind}_names are the ids and names of the objects of that kind
+    and {kind}s are their coordinates, one row per object, in the same order
+    """
+    batch = Batch(objects)
+    arrays = {}
+    for kind, objs, coordinates in (("point", batch.points, batch.p), ("line", batch.lines, batch.l), ("circle", batch.circles, batch.c)):
+        arrays[f"{kind}_ids"] = np.array([obj.id for obj in objs], dtype=np.int64)
+        arrays[f"{kind}_names"] = np.array([obj.name for obj in objs], dtype=str)
+        arrays[f"{kind}s"] = coordinates
+    np.savez(filename, **arrays)
+
+def angle(ua, ub, va, vb):
+    """vectorized angle(u, v)"""
+    x = ua * va + ub * vb
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(x != 0, np.abs(np.arctan((va * ub - ua * vb) / np.where(x != 0, x, 1))), np.pi / 2)
+
+def pairs(mask):
+    """index pairs i < j where the square mask is true"""
+    return zip(*np.nonzero(np.triu(mask, 1)))
+
+def check_pl(batch):
+    """is_pl for every point and line"""
+    a, b, c = batch.l.T
+    d = np.abs(np.outer(batch.p[:, 0], a) + np.outer(batch.p[:, 1], b) - c) / np.sqrt(a ** 2 + b ** 2)
+    for i, j in zip(*np.nonzero(d < EPSILON)):
+        yield batch.points[i], batch.lines[j]
+
+def check_pc(batch):
+    """is_pc for every point and circle"""
+    dx = batch.p[:, 0, None] - batch.c[None, :, 0]
+    dy = batch.p[:, 1, None] - batch.c[None, :, 1]
+    d = np.abs(batch.c[None, :, 2] - np.sqrt(dx ** 2 + dy ** 2))
+    for i, j in zip(*np.nonzero(d < EPSILON)):
+        yield batch.points[i], batch.circles[j]
+
+def check_lc(batch):
+    """is_lc for every line and circle"""
+    a, b, c = (x[:, None] for x in batch.l.T)
+    ox, oy, r = (x[None, :] for x in batch.c.T)
+    d = np.abs(np.abs(a * ox + b * oy - c) / np.sqrt(a ** 2 + b ** 2) - r)
+    for i, j in zip(*np.nonzero(d < EPSILON)):
+        yield batch.lines[i], batch.circles[j]
+
+def line_angles(batch):
+    a, b = batch.l[:, 0], batch.l[:, 1]
+    return angle(a[:, None], b[:, None], a[None, :], b[None, :])
+
+def check_parallel(batch, angles):
+    """is_parallel for every pair of lines"""
+    for i, j in pairs(angles < EPSILON):
+        yield batch.lines[i], batch.lines[j]
+
+def check_perpendicular(batch, angles):
+    """is_perpendicular for every pair of lines"""
+    for i, j in pairs(np.pi / 2 - angles < EPSILON):
+        yield batch.lines[i], batch.lines[j]
+
+def check_tangent(batch):
+    """is_tangent for every pair of circles, in either order"""
+    ox, oy, r = batch.c.T
+    d = np.sqrt((ox[:, None] - ox[None, :]) ** 2 + (oy[:, None] - oy[None, :]) ** 2)
+    # t = circles[j], s = circles[i] in is_tangent(s, t)
+    st = np.abs(np.abs(r[None, :] - d) - r[:, None]) < EPSILON
+    for i, j in pairs(st | st.T):
+        yield batch.circles[i], batch.circles[j]
+
+def check_collinear(batch):
+    """is_collinear for every triple of points, a being the first one in the sorted order"""
+    x, y = batch.p.T
+    n = len(batch.points)
+    for i in range(n - 2):
+        bx, by = x[i + 1:, None], y[i + 1:, None]
+        cx, cy = x[None, i + 1:], y[None, i + 1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d = np.abs((cy - by) * x[i] + (bx - cx) * y[i] - (bx * cy - by * cx)) / np.sqrt((bx - cx) ** 2 + (by - cy) ** 2)
+        for j, k in pairs(d < EPSILON):
+            yield batch.points[i], batch.points[i + 1 + j], batch.points[i + 1 + k]
+
+def check_concurrent(batch):
+    """is_concurrent for every triple of lines"""
+    a, b, c = batch.l.T
+    m = len(batch.lines)
+    for i in range(m - 2):
+        va, vb, vc = a[i + 1:, None], b[i + 1:, None], c[i + 1:, None]
+        wa, wb, wc = a[None, i + 1:], b[None, i + 1:], c[None, i + 1:]
+        d = np.abs(a[i] * vc * wb + b[i] * va * wc + c[i] * vb * wa - a[i] * vb * wc - b[i] * vc * wa - c[i] * va * wb)
+        for j, k in pairs(d < EPSILON):
+            yield batch.lines[i], batch.lines[i + 1 + j], batch.lines[i + 1 + k]
+
+def angle_ppp(ax, ay, bx, by, cx, cy):
+    """vectorized angle_ppp(a, b, c)"""
+    return angle(by - ay, ax - bx, cy - ay, ax - cx)
+
+def check_concyclic(batch):
+    """
+    is_concyclic for every quadruple of points
+    candidates are the quadruples whose fourth point is close to the circumcircle of the first three
+    """
+    x, y = batch.p.T
+    n = len(batch.points)
+    for i in range(n - 3):
+        for j in range(i + 1, n - 2):
+            # circumcircles of i, j and every k > j
+            ax, ay, bx, by = x[i], y[i], x[j], y[j]
+            cx, cy = x[j + 1:], y[j + 1:]
+            d = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+            a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ox = (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d
+                oy = (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d
+                r = np.sqrt((ax - ox) ** 2 + (ay - oy) ** 2)
+                # distance of every l > j to every circle, only l > k is used
+                on = np.abs(np.sqrt((cx[None, :] - ox[:, None]) ** 2 + (cy[None, :] - oy[:, None]) ** 2) - r[:, None]) < PRUNE
+            on &= (np.abs(d) >= EPSILON ** 2)[:, None]
+            k, l = np.nonzero(np.triu(on, 1))
+            if not len(k):
+                continue
+            # same formula as is_concyclic(a, b, c, d) for the candidates
+            kx, ky, lx, ly = cx[k], cy[k], cx[l], cy[l]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                hit = (np.abs(angle_ppp(ax, ay, bx, by, kx, ky) - angle_ppp(lx, ly, bx, by, kx, ky)) < EPSILON) & (np.abs(angle_ppp(bx, by, ax, ay, kx, ky) - angle_ppp(lx, ly, ax, ay, kx, ky)) < EPSILON)
+            for k, l in zip(k[hit], l[hit]):
+                yield batch.points[i], batch.points[j], batch.points[j + 1 + k], batch.points[j + 1 + l]
+
+def check_everything_batch(objects, check_functions, context):
+    """
+    checks every property of the objects at once with numpy
+    every predicate is evaluated over all candidate tuples with the same formula as its check function
+    and the hits are added to the property of that check function in the context, like the check functions do
+    """
+    batch = Batch(objects)
+    angles = line_angles(batch)
+    hits = {
+        "is_pl": check_pl(batch),
+        "is_pc": check_pc(batch),
+        "is_lc": check_lc(batch),
+        "is_parallel": check_parallel(batch, angles),
+        "is_perpendicular": check_perpendicular(batch, angles),
+        "is_tangent": check_tangent(batch),
+        "is_collinear": check_collinear(batch),
+        "is_concurrent": check_concurrent(batch),
+        "is_concyclic": check_concyclic(batch),
+    }
+    for name, tuples in hits.items():
+        for objs in tuples:
+            context.add_fact(check_functions[name].property_name, objs)
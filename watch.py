@@ -0,0 +1,128 @@
+from os import path, stat
+from time import sleep
+from select import select
+import ctypes
+import ctypes.util
+import struct
+
+# inotify event masks, from sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0x00000800
+
+# seconds to wait for the other events of the same save, editors usually write a file in several steps
+DEBOUNCE = 0.01
+# seconds between two checks of the files when inotify is not available
+POLL_INTERVAL = 0.05
+
+def load_libc():
+    """libc with the inotify functions, None if they are not available (not linux)"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class InotifyWatcher:
+    """
+    waits for changes of the files with inotify
+    the directories of the files are watched instead of the files, so that files replaced by the editor on save are noticed too
+
+    fd: int
+        inotify file descriptor
+    directories: dict[int, str]
+        watched directory of every watch descriptor
+    """
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+
+    def watch(self, filenames):
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for directory in {path.dirname(path.abspath(filename)) for filename in filenames} - set(self.directories.values()):
+            wd = self.libc.inotify_add_watch(self.fd, directory.encode(), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.directories[wd] = directory
+
+    def read(self) -> set[str]:
+        """paths of the files in the events that are ready"""
+        changed = set()
+        while select([self.fd], [], [], 0)[0]:
+            try:
+                data = open(self.fd, "rb", buffering=0, closefd=False).read(65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            i = 0
+            while i < len(data):
+                wd, _, _, length = struct.unpack_from("iIII", data, i)
+                name = data[i + 16:i + 16 + length].rstrip(b"\0").decode()
+                changed.add(path.join(self.directories.get(wd, ""), name))
+                i += 16 + length
+        return changed
+
+    def wait(self, filenames) -> set[str]:
+        """blocks until at least one of the files is changed, returns the changed ones"""
+        self.watch(filenames)
+        filenames = {path.abspath(filename) for filename in filenames}
+        while True:
+            select([self.fd], [], [])
+            changed = self.read()
+            sleep(DEBOUNCE)
+            changed |= self.read()
+            changed &= filenames
+            if changed:
+                return changed
+
+class StatWatcher:
+    """
+    waits for changes of the files by checking their modification times and sizes periodically
+
+    stats: dict[str, (int, int)]
+        last seen modification time and size of every file
+    """
+    def __init__(self):
+        self.stats = {}
+
+    @staticmethod
+    def stat(filename):
+        try:
+            result = stat(filename)
+        except OSError:
+            return None
+        return result.st_mtime_ns, result.st_size
+
+    def wait(self, filenames) -> set[str]:
+        """blocks until at least one of the files is changed, returns the changed ones"""
+        for filename in filenames:
+            if filename not in self.stats:
+                self.stats[filename] = self.stat(filename)
+        while True:
+            sleep(POLL_INTERVAL)
+            changed = set()
+            for filename in filenames:
+                current = self.stat(filename)
+                if current != self.stats[filename]:
+                    self.stats[filename] = current
+                    changed.add(path.abspath(filename))
+            if changed:
+                return changed
+
+def watcher():
+    """inotify watcher if it is available, stat watcher otherwise"""
+    libc = load_libc()
+    if libc is not None:
+        try:
+            return InotifyWatcher(libc)
+        except OSError:
+            pass
+    return StatWatcher()